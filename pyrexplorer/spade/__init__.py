@@ -1,13 +1,18 @@
-#
-# Copyright 2015 Mikhail Titov
-#
-# Licensed under the Apache License, Version 2.0 (the 'License');
-# you may not use this file except in compliance with the License.
-# You may obtain a copy of the License at
-#
-#     http://www.apache.org/licenses/LICENSE-2.0
-#
-
-__all__ = ['SPADEm']
-
-from .spade import SPADEm
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+
+__all__ = ['SPADEm', 'MiningSession', 'ItemEncoder',
+           'IDLIST_ENGINE', 'BITMAP_ENGINE',
+           'DFS_STRATEGY', 'BFS_STRATEGY', 'AUTO_STRATEGY']
+
+from .encoder import ItemEncoder
+from .spade import (SPADEm, IDLIST_ENGINE, BITMAP_ENGINE,
+                    DFS_STRATEGY, BFS_STRATEGY, AUTO_STRATEGY)
+from .session import MiningSession
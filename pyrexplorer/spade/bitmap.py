@@ -0,0 +1,249 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['BitmapLayout', 'BitmapIdList']
+
+from bisect import bisect_right
+
+from .idlist import IdList
+
+
+class BitmapLayout(object):
+
+    """
+    Class represents bit positions of the vertical bitmap: one bit per
+    (sid, itemset position), bits of every sid form a consecutive block.
+    """
+
+    def __init__(self, sizes):
+        """
+        Initialization.
+
+        @param sizes: Number of itemsets per sequence {sid: <size>}.
+        @type sizes: dict
+        """
+        self.sids = sorted(sizes)
+        self.offsets, self.widths = [], []
+
+        self.size = 0
+        for sid in self.sids:
+            self.offsets.append(self.size)
+            self.widths.append(sizes[sid])
+            self.size += sizes[sid]
+
+        self._sid_idx = dict([(sid, idx) for idx, sid in enumerate(self.sids)])
+        self._masks = {}
+
+        self._shifts, shift = [], 1
+        while shift < max(self.widths or [0]):
+            self._shifts.append(shift)
+            shift <<= 1
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        """
+        Create layout for the dictionary of sequences.
+
+        @param sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
+        @type sequences: dict
+        @return: BitmapLayout object.
+        @rtype: BitmapLayout
+        """
+        return cls(dict([(sid, len(sequences[sid])) for sid in sequences]))
+
+    def position(self, sid, eid):
+        """
+        Get bit position of the event.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @param eid: Event id (index of itemset in the sequence).
+        @type eid: int
+        @return: Bit position.
+        @rtype: int
+        """
+        return self.offsets[self._sid_idx[sid]] + eid
+
+    def to_bits(self, items):
+        """
+        Get bitmap of events.
+
+        @param items: Pairs of sid and eids.
+        @type items: iterable
+        @return: Bitmap.
+        @rtype: int/long
+        """
+        output = bytearray(self.size // 8 + 1)
+        for sid, eids in items:
+            offset = self.offsets[self._sid_idx[sid]]
+            for eid in eids:
+                position = offset + eid
+                output[position >> 3] |= 1 << (position & 7)
+        output.reverse()
+        return int(str(output).encode('hex'), 16)
+
+    def to_items(self, bits):
+        """
+        Generator of (sid, eids) pairs of the bitmap ordered by sid.
+
+        @param bits: Bitmap.
+        @type bits: int/long
+        @return: Sequence id and corresponding event ids.
+        @rtype: tuple
+        """
+        bit_string = bin(bits)[:1:-1]
+
+        sid_idx, eids = None, []
+        position = bit_string.find('1')
+        while position != -1:
+            idx = bisect_right(self.offsets, position) - 1
+            if idx != sid_idx:
+                if eids:
+                    yield self.sids[sid_idx], eids
+                sid_idx, eids = idx, []
+            eids.append(position - self.offsets[idx])
+            position = bit_string.find('1', position + 1)
+
+        if eids:
+            yield self.sids[sid_idx], eids
+
+    def get_mask(self, name, shift=0):
+        """
+        Get mask of bits with certain positions inside of every sid block
+        ("first" - first bit of a block, "tail" - bits with in-block offset
+        not less than shift, "head" - bits with in-block offset less than
+        block width minus shift).
+
+        @param name: Mask name.
+        @type name: str
+        @param shift: Bit shift.
+        @type shift: int
+        @return: Bit mask.
+        @rtype: int/long
+        """
+        key = (name, shift)
+        if key not in self._masks:
+
+            blocks = []
+            for width in self.widths:
+                if name == 'first':
+                    blocks.append('1'[:width] + '0' * (width - 1))
+                elif name == 'tail':
+                    blocks.append(
+                        '0' * min(shift, width) + '1' * (width - shift))
+                elif name == 'head':
+                    blocks.append(
+                        '1' * (width - shift) + '0' * min(shift, width))
+            self._masks[key] = int(''.join(blocks)[::-1] or '0', 2)
+
+        return self._masks[key]
+
+    def shifts(self):
+        """
+        Get bit shifts to spread bits over the whole block (powers of two).
+
+        @return: List of shifts.
+        @rtype: list
+        """
+        return self._shifts
+
+
+class BitmapIdList(IdList):
+
+    """
+    Id-list represented as a bitmap (one bit per sid and itemset position),
+    joins and support are computed by bitwise operations.
+    """
+
+    __slots__ = ('layout', 'bits')
+
+    def __init__(self, layout, bits=0):
+        """
+        Initialization.
+
+        @param layout: Bit positions description.
+        @type layout: BitmapLayout
+        @param bits: Bitmap.
+        @type bits: int/long
+        """
+        self.layout = layout
+        self.bits = bits
+
+    def new(self):
+        return self.__class__(layout=self.layout)
+
+    def new_from(self, items):
+        return self.__class__(layout=self.layout,
+                              bits=self.layout.to_bits(items))
+
+    def add(self, sid, eid):
+        self.bits |= 1 << self.layout.position(sid, eid)
+
+    def extend(self, sid, eids):
+        self.bits |= self.layout.to_bits([(sid, eids)])
+
+    def update(self, id_list):
+        if isinstance(id_list, IdList):
+            id_list = id_list.materialize()
+        if (isinstance(id_list, BitmapIdList)
+                and id_list.layout is self.layout):
+            self.bits |= id_list.bits
+        else:
+            super(BitmapIdList, self).update(id_list)
+
+    def difference(self, id_list):
+        return self.__class__(layout=self.layout,
+                              bits=self.bits & ~id_list.materialize().bits)
+
+    def union(self, id_lists):
+        bits = self.bits
+        for id_list in id_lists:
+            bits |= id_list.materialize().bits
+        return self.__class__(layout=self.layout, bits=bits)
+
+    def equal_join(self, id_list):
+        return self.__class__(layout=self.layout,
+                              bits=self.bits & id_list.materialize().bits)
+
+    def temporal_join(self, id_list, constraints=None):
+        if constraints:
+            # gaps are checked event by event (eids are itemset positions)
+            return super(BitmapIdList, self).temporal_join(
+                id_list.materialize(), constraints=constraints)
+        # spread bits of every block towards the end of the block (S-step)
+        bits = (self.bits << 1) & self.layout.get_mask('tail', 1)
+        for shift in self.layout.shifts():
+            bits |= (bits << shift) & self.layout.get_mask('tail', shift)
+        return self.__class__(layout=self.layout,
+                              bits=bits & id_list.materialize().bits)
+
+    def items(self):
+        return self.layout.to_items(self.bits)
+
+    @property
+    def support(self):
+        # spread bits of every block towards the start of the block
+        bits = self.bits
+        for shift in self.layout.shifts():
+            bits |= (bits >> shift) & self.layout.get_mask('head', shift)
+        return bin(bits & self.layout.get_mask('first')).count('1')
+
+    @property
+    def nbytes(self):
+        return (self.bits.bit_length() + 7) // 8
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __nonzero__(self):
+        return bool(self.bits)
@@ -0,0 +1,128 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['CoOccurrenceMap', 'get_items_mask']
+
+from .element import EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE
+
+
+def get_items_mask(items):
+    """
+    Get bitset of items (bit per item code).
+
+    @param items: Item codes.
+    @type items: list/tuple/set
+    @return: Bitset of items.
+    @rtype: int/long
+    """
+    output = 0
+    for item in items:
+        output |= 1 << item
+    return output
+
+
+class CoOccurrenceMap(object):
+
+    """
+    Class represents CMAP (Co-occurrence Map) as two dense bit matrices (per
+    connection type) over item codes: row of the item is a bitset of items
+    that follow it in frequent 2-sequences.
+    """
+
+    def __init__(self):
+        """Initialization."""
+        self._rows = {EVENT_ATOM_TYPE: [], SEQUENCE_ATOM_TYPE: []}
+
+    def __nonzero__(self):
+        return any(self._rows.itervalues())
+
+    def add(self, item, conn_type, connected_item):
+        """
+        Add connection between items (from frequent 2-sequence).
+
+        @param item: Master item (prefix of 2-sequence).
+        @type item: int
+        @param conn_type: Connection type.
+        @type conn_type: int
+        @param connected_item: Connected item.
+        @type connected_item: int
+        """
+        rows = self._rows[conn_type]
+        if item >= len(rows):
+            rows.extend([0] * (item + 1 - len(rows)))
+        rows[item] |= 1 << connected_item
+
+    def get_row(self, item, conn_type):
+        """
+        Get bitset of items connected with the item.
+
+        @param item: Master item.
+        @type item: int
+        @param conn_type: Connection type.
+        @type conn_type: int
+        @return: Bitset of connected items.
+        @rtype: int/long
+        """
+        rows = self._rows[conn_type]
+        return rows[item] if item < len(rows) else 0
+
+    def get_items(self, item, conn_type):
+        """
+        Get items connected with the item.
+
+        @param item: Master item.
+        @type item: int
+        @param conn_type: Connection type.
+        @type conn_type: int
+        @return: Connected items (in ascending order).
+        @rtype: list
+        """
+        output, row, connected_item = [], self.get_row(item, conn_type), 0
+        while row:
+            if row & 1:
+                output.append(connected_item)
+            row >>= 1
+            connected_item += 1
+        return output
+
+    def has(self, item, conn_type, connected_item):
+        """
+        Check connection between items.
+
+        @param item: Master item.
+        @type item: int
+        @param conn_type: Connection type.
+        @type conn_type: int
+        @param connected_item: Connected item.
+        @type connected_item: int
+        @return: Flag that 2-sequence of items is frequent.
+        @rtype: bool
+        """
+        return bool(self.get_row(item, conn_type) >> connected_item & 1)
+
+    def clear(self):
+        """Remove all connections."""
+        for rows in self._rows.itervalues():
+            del rows[:]
+
+    def copy(self):
+        """
+        Get copy of the map.
+
+        @return: CoOccurrenceMap object.
+        @rtype: CoOccurrenceMap
+        """
+        output = CoOccurrenceMap()
+        for conn_type, rows in self._rows.iteritems():
+            output._rows[conn_type] = list(rows)
+        return output
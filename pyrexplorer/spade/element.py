@@ -11,43 +11,385 @@
 # - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
 #
 
-__all__ = ['Element', 'ElementDict', 'EVENT_ATOM_TYPE', 'SEQUENCE_ATOM_TYPE']
+__all__ = ['Element', 'ElementDict', 'Pattern', 'SequenceNode',
+           'EVENT_ATOM_TYPE', 'SEQUENCE_ATOM_TYPE']
 
 from collections import namedtuple
 
+from .idlist import ArrayIdList, Event
+
 UNKNOWN_ATOM_TYPE = 0
 EVENT_ATOM_TYPE = 1
 SEQUENCE_ATOM_TYPE = 2  # EVENT_ATOM_TYPE < SEQUENCE_ATOM_TYPE
 
-Event = namedtuple('Event', ['sid', 'eid'])
+
+class Pattern(namedtuple('Pattern',
+                          ['sequence', 'support', 'occurrences'])):
+
+    """
+    Class represents found sequential pattern (without id-list), i.e. compact
+    result record with sequence, support and (optionally) the number of
+    occurrences (events of the id-list).
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, sequence, support, occurrences=None):
+        return super(Pattern, cls).__new__(cls, sequence, support,
+                                           occurrences)
+
+    @classmethod
+    def from_element(cls, element):
+        """
+        Create pattern of the element (its id-list is not kept).
+
+        @param element: Element object.
+        @type element: Element
+        @return: Pattern object.
+        @rtype: Pattern
+        """
+        return cls(sequence=element.sequence,
+                   support=element.support,
+                   occurrences=len(element.id_list))
+
+    @property
+    def sequence_length(self):
+        """
+        Get length of sequential pattern (k: k-sequence).
+
+        @return: Sum of itemset lengths (items per event).
+        @rtype: int
+        """
+        return sum([len(x) for x in self.sequence])
+
+    @property
+    def sequence_size(self):
+        """
+        Get number of itemsets in pattern's sequence.
+
+        @return: Number of itemsets in sequence.
+        @rtype: int
+        """
+        return len(self.sequence)
+
+
+class SequenceNode(object):
+
+    """
+    Class represents node of the prefix trie of sequences, i.e. sequence is
+    a reference to its last node and sequences with the same prefix share
+    the parent node. Children are interned by the parent, thus equality and
+    hashing are identity based. Tuple of itemsets is created on demand only
+    (e.g., for the output).
+    """
+
+    __slots__ = ('parent', 'item', 'conn_type', 'length', 'size', 'previous',
+                 '_children', '_sequence', '_itemset')
+
+    def __init__(self, parent=None, item=None, conn_type=None):
+        """
+        Initialization (node without parent is the root, empty sequence).
+
+        @param parent: Parent node (prefix).
+        @type parent: SequenceNode/None
+        @param item: The last item of the sequence.
+        @type item: type(Item)/None
+        @param conn_type: Type of atom (how prefix connects to the item).
+        @type conn_type: int/None
+        """
+        self.parent = parent
+        self.item = item
+        self.conn_type = conn_type or UNKNOWN_ATOM_TYPE
+
+        self._children = None
+        self._sequence = None
+        self._itemset = None
+
+        if parent is None:
+            self.length, self.size, self.previous = 0, 0, None
+        elif (self.conn_type == EVENT_ATOM_TYPE
+                and parent.parent is not None):
+            # item is added to the last itemset of the prefix
+            self.length, self.size = parent.length + 1, parent.size
+            self.previous = parent.previous
+        else:
+            self.length, self.size = parent.length + 1, parent.size + 1
+            self.previous = parent
+
+    @classmethod
+    def from_sequence(cls, sequence=None):
+        """
+        Create (not interned) chain of nodes for the sequence.
+
+        @param sequence: Sequence of itemsets.
+        @type sequence: tuple of tuples/None
+        @return: Node of the last item (the root for empty sequence).
+        @rtype: SequenceNode
+        """
+        node = cls()
+        for idx, itemset in enumerate(sequence or ()):
+            for item_idx, item in enumerate(itemset):
+                if item_idx:
+                    conn_type = EVENT_ATOM_TYPE
+                elif idx:
+                    conn_type = SEQUENCE_ATOM_TYPE
+                else:
+                    conn_type = None
+                node = cls(parent=node, item=item, conn_type=conn_type)
+        return node
+
+    def get_child(self, item, conn_type):
+        """
+        Get (interned) node of the sequence extended by the item.
+
+        @param item: Key item of the extension.
+        @type item: type(Item)
+        @param conn_type: Type of atom (how sequence connects to the item).
+        @type conn_type: int/None
+        @return: Child node.
+        @rtype: SequenceNode
+        """
+        key = (item, conn_type or UNKNOWN_ATOM_TYPE)
+        if self._children is None:
+            self._children = {}
+        node = self._children.get(key)
+        if node is None:
+            node = self._children[key] = SequenceNode(
+                parent=self, item=item, conn_type=conn_type)
+        return node
+
+    def clear_children(self):
+        """Release interned children (they are kept by their references)."""
+        self._children = None
+
+    @property
+    def itemset(self):
+        """
+        Get the last itemset of the sequence.
+
+        @return: Set of items.
+        @rtype: frozenset
+        """
+        if self._itemset is None:
+            if self.size == self.parent.size:
+                self._itemset = self.parent.itemset | frozenset([self.item])
+            else:
+                self._itemset = frozenset([self.item])
+        return self._itemset
+
+    @property
+    def itemsets(self):
+        """
+        Get itemsets of the sequence (walk over the last nodes of itemsets).
+
+        @return: Sets of items.
+        @rtype: tuple of frozensets
+        """
+        output, node = [], self
+        while node.parent is not None:
+            output.append(node.itemset)
+            node = node.previous
+        output.reverse()
+        return tuple(output)
+
+    @property
+    def items(self):
+        """
+        Get distinct items of the sequence.
+
+        @return: Set of items.
+        @rtype: frozenset
+        """
+        return frozenset().union(*self.itemsets)
+
+    @property
+    def sequence(self):
+        """
+        Get sequence of itemsets (it is created once).
+
+        @return: Sequence of itemsets.
+        @rtype: tuple of tuples
+        """
+        if self._sequence is None:
+            itemsets, itemset, node = [], [], self
+            while node.parent is not None:
+                itemset.append(node.item)
+                if node.size != node.parent.size:
+                    itemset.reverse()
+                    itemsets.append(tuple(itemset))
+                    itemset = []
+                node = node.parent
+            itemsets.reverse()
+            self._sequence = tuple(itemsets)
+        return self._sequence
+
+    def compare(self, other):
+        """
+        Compare sequences of nodes in the order of tuples of itemsets without
+        creating them (the first different item from the root defines the
+        order, an item of the next itemset precedes an item of the same
+        itemset, a prefix precedes its extensions).
+
+        @param other: Node of the other sequence.
+        @type other: SequenceNode
+        @return: Negative, zero or positive number (as built-in cmp).
+        @rtype: int
+        """
+        node_i, node_j = self, other
+        output = cmp(node_i.length, node_j.length)
+        while node_i.length > node_j.length:
+            node_i = node_i.parent
+        while node_j.length > node_i.length:
+            node_j = node_j.parent
+
+        while node_i is not node_j and node_i.parent is not None:
+            result = (cmp(node_i.size == node_i.parent.size,
+                          node_j.size == node_j.parent.size)
+                      or cmp(node_i.item, node_j.item))
+            if result:
+                output = result
+            node_i, node_j = node_i.parent, node_j.parent
+        return output
+
+    # nodes are ordered by their sequences (equality is identity based)
+
+    def __lt__(self, other):
+        return self.compare(other) < 0
+
+    def __le__(self, other):
+        return self.compare(other) <= 0
+
+    def __gt__(self, other):
+        return self.compare(other) > 0
+
+    def __ge__(self, other):
+        return self.compare(other) >= 0
+
+    def __reduce__(self):
+        # interned children and cached data are not passed
+        return self.__class__, (self.parent, self.item, self.conn_type)
+
+    def __repr__(self):
+        """
+        String representation of an object.
+
+        @return: Object description.
+        @rtype: str
+        """
+        return '<SequenceNode: sequence=%s>' % (self.sequence,)
 
 
 class Element(object):
 
-    """Class represents atom set with corresponding id-list."""
+    """
+    Class represents atom set with corresponding id-list. Sequence is a node
+    of the prefix trie (children of the same prefix share the parent node),
+    support is cached until the id-list is changed.
+    """
 
-    def __init__(self, item, prefix=None, conn_type=None, sid=None, eid=None):
+    __slots__ = ('key_item', 'conn_type', 'node', '_id_list', '_support')
+
+    def __init__(self, item, prefix=None, conn_type=None, sid=None, eid=None,
+                 id_list=None):
         """
         Initialization.
 
         @param item: Atom's last item (i.e. key item).
         @type item: type(Item)
-        @param prefix: Atom's prefix.
-        @type prefix: tuple/None
+        @param prefix: Atom's prefix (sequence or node of the prefix trie).
+        @type prefix: tuple/SequenceNode/None
         @param conn_type: Type of atom (how prefix connects to the last item).
         @type conn_type: int/None
         @param sid: Sequence id.
         @type sid: int/None
         @param eid: Event id.
         @type eid: int/None
+        @param id_list: Initial id-list (defines id-list representation).
+        @type id_list: IdList/None
         """
         self.key_item = item
-        self.prefix = prefix
         self.conn_type = conn_type or UNKNOWN_ATOM_TYPE
 
-        self.id_list = set()
+        if not isinstance(prefix, SequenceNode):
+            prefix = SequenceNode.from_sequence(prefix)
+        self.node = prefix.get_child(item, self.conn_type)
+
+        self.id_list = id_list if id_list is not None else ArrayIdList()
         self.update_id_list(sid, eid)
 
+    @property
+    def prefix(self):
+        """
+        Atom's prefix.
+
+        @return: Sequence of itemsets/None (for 1-sequence).
+        @rtype: tuple of tuples/None
+        """
+        if self.node.parent.parent is None:
+            return None
+        return self.node.parent.sequence
+
+    @property
+    def sequence(self):
+        """
+        Atom's sequence (prefix - conn_type - item).
+
+        @return: Sequence of itemsets.
+        @rtype: tuple of tuples
+        """
+        return self.node.sequence
+
+    @property
+    def sequence_length(self):
+        """
+        Length of sequential pattern (k: k-sequence).
+
+        @return: Number of items in sequence.
+        @rtype: int
+        """
+        return self.node.length
+
+    @property
+    def sequence_size(self):
+        """
+        Number of itemsets in sequence.
+
+        @return: Number of itemsets.
+        @rtype: int
+        """
+        return self.node.size
+
+    @property
+    def id_list(self):
+        """
+        Element's id-list.
+
+        @return: IdList object.
+        @rtype: IdList
+        """
+        return self._id_list
+
+    @id_list.setter
+    def id_list(self, id_list):
+        self._id_list = id_list
+        self._support = None
+
+    def copy(self, id_list=None):
+        """
+        Get element of the same sequence (node of the prefix trie is shared).
+
+        @param id_list: Id-list of the copy (the same id-list by default).
+        @type id_list: IdList/None
+        @return: Element object.
+        @rtype: Element
+        """
+        output = self.__class__.__new__(self.__class__)
+        output.key_item = self.key_item
+        output.conn_type = self.conn_type
+        output.node = self.node
+        output.id_list = id_list if id_list is not None else self._id_list
+        return output
+
     def update_id_list(self, sid=None, eid=None, id_list=None):
         """
         Update element's id-list with new event(s).
@@ -56,12 +398,15 @@ class Element(object):
         @type sid: int/None
         @param eid: Event id.
         @type eid: int/None
-        @param id_list: List of Event objects (with parameters: sid and eid).
-        @type id_list: list/None
+        @param id_list: IdList object or list of Event objects.
+        @type id_list: IdList/list/None
         """
+        if (sid is not None and eid is not None) or id_list:
+            self.id_list = self._id_list.materialize()
         if sid is not None and eid is not None:
-            self.id_list.add(Event(sid=sid, eid=eid))
-        self.id_list.update(id_list or [])
+            self._id_list.add(sid, eid)
+        if id_list:
+            self._id_list.update(id_list)
 
     @staticmethod
     def generate_sequence(last_item, prefix=None, is_sequence_atom=False):
@@ -85,27 +430,6 @@ class Element(object):
 
         return output
 
-    @property
-    def sequence_length(self):
-        """
-        Get length of sequential pattern (k: k-sequence).
-
-        @return: Sum of itemset lengths (items per event).
-        @rtype: int
-        """
-        return sum([len(x) for x in self.prefix or ()]) + 1
-
-    @property
-    def sequence_size(self):
-        """
-        Get number of itemsets in Element's sequence.
-
-        @return: Number of itemsets in sequence.
-        @rtype: int
-        """
-        return (len(self.prefix or ((),)) +
-                1 if self.conn_type == SEQUENCE_ATOM_TYPE else 0)
-
     @property
     def support(self):
         """
@@ -114,121 +438,162 @@ class Element(object):
         @return: Number of distinct sids.
         @rtype: int
         """
-        sids = set()
-        for event in self.id_list:
-            sids.add(event.sid)
-        return len(sids)
-
-    @property
-    def sequence(self):
-        """
-        Element's sequence.
-
-        @return: Sequence (sequential pattern).
-        @rtype: tuple of tuples
-        """
-        return self.generate_sequence(
-            last_item=self.key_item,
-            prefix=self.prefix,
-            is_sequence_atom=(self.conn_type == SEQUENCE_ATOM_TYPE)
-        )
+        if self._support is None:
+            self._support = self._id_list.support
+        return self._support
 
     @classmethod
-    def join(cls, element_i, element_j, cmap=None):
+    def join(cls, element_i, element_j, cmap=None, constraints=None):
         """
         Temporal join of current element with other one (of the same prefix).
+        Id-lists are merged by sid, thus eids are compared within the same
+        sequence only.
 
         @param element_i: Element object.
         @type element_i: Element
         @param element_j: Element object.
         @type element_j: Element
         @param cmap: Co-occurrence Map.
-        @type cmap: dict/None
+        @type cmap: CoOccurrenceMap/None
+        @param constraints: Time constraints (gaps and window).
+        @type constraints: TimeConstraints/None
         @return: Set of Element objects grouped into ElementDict.
         @rtype: ElementDict
         """
         output = ElementDict()
+        for element in cls.join_elements(element_i=element_i,
+                                         element_j=element_j,
+                                         cmap=cmap,
+                                         constraints=constraints):
+            output.update(key=element.sequence, element=element)
+        return output
 
+    @classmethod
+    def join_elements(cls, element_i, element_j, cmap=None, constraints=None,
+                      sequence_atoms=True, is_candidate=None):
+        """
+        Temporal join of current element with other one (of the same prefix),
+        new sequences are nodes of the prefix trie (the same sequence is the
+        same node). Occurrences that violate time constraints are dropped
+        from id-lists of sequence atoms (cSPADE).
+
+        @param element_i: Element object.
+        @type element_i: Element
+        @param element_j: Element object.
+        @type element_j: Element
+        @param cmap: Co-occurrence Map.
+        @type cmap: CoOccurrenceMap/None
+        @param constraints: Time constraints (gaps and window).
+        @type constraints: TimeConstraints/None
+        @param sequence_atoms: Flag to create sequence atoms (otherwise they
+            are created by method join_items).
+        @type sequence_atoms: bool
+        @param is_candidate: Function (key item, prefix node, connection
+            type) to reject new sequences before id-lists are joined.
+        @type is_candidate: callable/None
+        @return: New Element objects (nodes are children of the joined
+            elements' nodes in the prefix trie).
+        @rtype: list
+        """
         skip_by_cmap = False
         if cmap:
 
             if element_i.conn_type == element_j.conn_type == EVENT_ATOM_TYPE:
 
-                if (element_i.key_item == element_j.key_item
-                    or (element_i.key_item < element_j.key_item
-                        and (element_j.key_item not in
-                             cmap[element_i.key_item][EVENT_ATOM_TYPE]))
-                    or (element_j.key_item < element_i.key_item
-                        and (element_i.key_item not in
-                             cmap[element_j.key_item][EVENT_ATOM_TYPE]))):
+                item_i, item_j = sorted([element_i.key_item,
+                                         element_j.key_item])
+                if (item_i == item_j
+                        or not cmap.has(item_i, EVENT_ATOM_TYPE, item_j)):
                     skip_by_cmap = True
 
             elif (element_i.conn_type == SEQUENCE_ATOM_TYPE
                     and element_j.conn_type == EVENT_ATOM_TYPE):
 
-                if (element_i.key_item not in
-                        cmap[element_j.key_item][SEQUENCE_ATOM_TYPE]):
+                if not cmap.has(element_j.key_item, SEQUENCE_ATOM_TYPE,
+                                element_i.key_item):
                     skip_by_cmap = True
 
             elif (element_j.conn_type == SEQUENCE_ATOM_TYPE
                     and element_i.conn_type == EVENT_ATOM_TYPE):
 
-                if (element_j.key_item not in
-                        cmap[element_i.key_item][SEQUENCE_ATOM_TYPE]):
+                if not cmap.has(element_i.key_item, SEQUENCE_ATOM_TYPE,
+                                element_j.key_item):
                     skip_by_cmap = True
 
-        if not skip_by_cmap:
-
-            for pair_i in element_i.id_list:
-                for pair_j in element_j.id_list:
-
-                    if pair_i.sid != pair_j.sid:
-                        continue
-
-                    # - create event atom -
-                    if pair_i.eid == pair_j.eid:
-                        if (element_i.conn_type != element_j.conn_type
-                                or element_i.key_item == element_j.key_item):
-                            continue
-                        elif element_i.key_item < element_j.key_item:
-                            key_item = element_j.key_item
-                            prefix = element_i.sequence
-                        elif element_i.key_item > element_j.key_item:
-                            key_item = element_i.key_item
-                            prefix = element_j.sequence
-
-                        conn_type = EVENT_ATOM_TYPE
-                        eid = pair_i.eid
-
-                    # - create sequence atom -
-                    else:
-                        if pair_i.eid < pair_j.eid:
-                            if element_j.conn_type == EVENT_ATOM_TYPE:
-                                continue
-                            key_item = element_j.key_item
-                            prefix = element_i.sequence
-                            eid = pair_j.eid
-
-                        else:  # pair_i.eid > pair_j.eid
-                            if element_i.conn_type == EVENT_ATOM_TYPE:
-                                continue
-                            key_item = element_i.key_item
-                            prefix = element_j.sequence
-                            eid = pair_i.eid
-
-                        conn_type = SEQUENCE_ATOM_TYPE
-
-                    sequence = cls.generate_sequence(
-                        last_item=key_item,
-                        prefix=prefix,
-                        is_sequence_atom=(conn_type == SEQUENCE_ATOM_TYPE)
-                    )
-
-                    if sequence not in output:
-                        output[sequence] = Element(
-                            item=key_item, prefix=prefix, conn_type=conn_type)
-                    output.add_event(key=sequence, sid=pair_i.sid, eid=eid)
+        if skip_by_cmap:
+            return []
+
+        if is_candidate is None:
+            is_candidate = lambda *args: True
+
+        atoms = []
+
+        # - create event atom -
+        if (element_i.conn_type == element_j.conn_type
+                and element_i.key_item != element_j.key_item):
+            if element_i.key_item < element_j.key_item:
+                key_item = element_j.key_item
+                prefix = element_i.node
+            else:
+                key_item = element_i.key_item
+                prefix = element_j.node
+            if is_candidate(key_item, prefix, EVENT_ATOM_TYPE):
+                atoms.append((key_item, prefix, EVENT_ATOM_TYPE,
+                              element_i.id_list.equal_join(element_j.id_list)))
+
+        # - create sequence atoms -
+        if (sequence_atoms
+                and element_j.conn_type != EVENT_ATOM_TYPE
+                and is_candidate(element_j.key_item, element_i.node,
+                                 SEQUENCE_ATOM_TYPE)):
+            atoms.append((element_j.key_item, element_i.node,
+                          SEQUENCE_ATOM_TYPE,
+                          element_i.id_list.temporal_join(
+                              element_j.id_list, constraints=constraints)))
+
+        if (sequence_atoms
+                and element_i.conn_type != EVENT_ATOM_TYPE
+                and element_i is not element_j
+                and is_candidate(element_i.key_item, element_j.node,
+                                 SEQUENCE_ATOM_TYPE)):
+            atoms.append((element_i.key_item, element_j.node,
+                          SEQUENCE_ATOM_TYPE,
+                          element_j.id_list.temporal_join(
+                              element_i.id_list, constraints=constraints)))
+
+        return [cls(item=key_item, prefix=prefix, conn_type=conn_type,
+                    id_list=id_list)
+                for key_item, prefix, conn_type, id_list in atoms if id_list]
+
+    @classmethod
+    def join_items(cls, element, item_id_lists, items, constraints=None):
+        """
+        Sequence atoms of the element with items (cSPADE with the maximum
+        gap): the new itemset follows the last itemset of the element within
+        the gap, thus candidate items are the ones that follow the key item
+        in frequent 2-sequences, while the sequence without the element's
+        last itemset could be not frequent (siblings are not required).
 
+        @param element: Element object.
+        @type element: Element
+        @param item_id_lists: Id-lists of items {item: IdList}.
+        @type item_id_lists: dict
+        @param items: Items to join with.
+        @type items: iterable
+        @param constraints: Time constraints (gaps and window).
+        @type constraints: TimeConstraints/None
+        @return: New Element objects (nodes are children of the element's
+            node in the prefix trie).
+        @rtype: list
+        """
+        output = []
+        for item in items:
+            id_list = element.id_list.temporal_join(item_id_lists[item],
+                                                    constraints=constraints)
+            if id_list:
+                output.append(cls(item=item, prefix=element.node,
+                                  conn_type=SEQUENCE_ATOM_TYPE,
+                                  id_list=id_list))
         return output
 
     def __repr__(self):
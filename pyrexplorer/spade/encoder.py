@@ -0,0 +1,153 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['ItemEncoder']
+
+
+class ItemEncoder(object):
+
+    """
+    Class represents dictionary encoding of items, i.e. mapping of items to
+    dense integer codes (0, 1, 2, ...) and back.
+    """
+
+    def __init__(self, items=None):
+        """
+        Initialization.
+
+        @param items: Items in order of code assignment.
+        @type items: iterable/None
+        """
+        self._codes = {}
+        self._items = []
+
+        for item in items or []:
+            self.encode_item(item)
+
+    @classmethod
+    def from_sequences(cls, sequences, frequency_order=False):
+        """
+        Create encoder for items of the dictionary of sequences.
+
+        @param sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
+        @type sequences: dict
+        @param frequency_order: Flag to assign codes in descending order of
+            item support (otherwise codes follow the sorted order of items),
+            maximal sequences could differ with it, since master elements of
+            equivalence classes are picked in order of codes (closed and all
+            frequent sequences do not depend on the order).
+        @type frequency_order: bool
+        @return: ItemEncoder object.
+        @rtype: ItemEncoder
+        """
+        supports = {}
+        for sid in sequences:
+            items = set()
+            for itemset in sequences[sid].itervalues():
+                items.update(itemset)
+            for item in items:
+                supports[item] = supports.get(item, 0) + 1
+
+        if frequency_order:
+            items = sorted(supports, key=lambda x: (-supports[x], x))
+        else:
+            items = sorted(supports)
+
+        return cls(items=items)
+
+    def encode_item(self, item):
+        """
+        Get code of the item (new code is assigned to unknown item).
+
+        @param item: Item.
+        @type item: type(Item)
+        @return: Item code.
+        @rtype: int
+        """
+        code = self._codes.get(item)
+        if code is None:
+            code = self._codes[item] = len(self._items)
+            self._items.append(item)
+        return code
+
+    def decode_item(self, code):
+        """
+        Get item by its code.
+
+        @param code: Item code.
+        @type code: int
+        @return: Item.
+        @rtype: type(Item)
+        """
+        return self._items[code]
+
+    def encode_sequences(self, sequences):
+        """
+        Get dictionary of sequences with encoded items.
+
+        @param sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
+        @type sequences: dict
+        @return: Dictionary of sequences {sid: {eid: <itemset of codes>}}.
+        @rtype: dict
+        """
+        output = {}
+        for sid in sequences:
+            output[sid] = dict([
+                (eid, tuple([self.encode_item(x) for x in itemset]))
+                for eid, itemset in sequences[sid].iteritems()])
+        return output
+
+    def decode_sequences(self, sequences):
+        """
+        Get dictionary of sequences with decoded items.
+
+        @param sequences: Dictionary of sequences {sid: {eid: <itemset of
+            codes>}}.
+        @type sequences: dict
+        @return: Dictionary of sequences {sid: {eid: <itemset>}}.
+        @rtype: dict
+        """
+        output = {}
+        for sid in sequences:
+            output[sid] = dict([
+                (eid, tuple([self._items[x] for x in itemset]))
+                for eid, itemset in sequences[sid].iteritems()])
+        return output
+
+    def decode_sequence(self, sequence):
+        """
+        Get sequence (tuple of itemsets) with decoded items (itemsets are
+        sorted, i.e. they do not depend on the order of codes).
+
+        @param sequence: Sequence of itemsets with item codes.
+        @type sequence: tuple of tuples
+        @return: Sequence of itemsets with items.
+        @rtype: tuple of tuples
+        """
+        return tuple([tuple(sorted([self._items[x] for x in itemset]))
+                      for itemset in sequence])
+
+    def get_items(self):
+        """
+        Get items in order of their codes.
+
+        @return: List of items.
+        @rtype: list
+        """
+        return list(self._items)
+
+    def __contains__(self, item):
+        return item in self._codes
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,704 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['Event', 'TimeConstraints', 'IdList', 'EventSetIdList',
+           'ArrayIdList', 'WindowIdList', 'DiffIdList', 'SupportIdList']
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from sys import getsizeof
+
+Event = namedtuple('Event', ['sid', 'eid'])
+EVENT_SIZE = getsizeof(Event(sid=0, eid=0))
+ARRAY_SIZE = getsizeof(array('i'))
+
+
+class TimeConstraints(namedtuple('TimeConstraints',
+                                 ['min_gap', 'max_gap', 'max_window'])):
+
+    """
+    Class represents time constraints of sequential patterns (cSPADE) in
+    units of eids: minimum and maximum gap between consecutive itemsets and
+    the maximum window between the first and the last itemsets.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, min_gap=None, max_gap=None, max_window=None):
+        return super(TimeConstraints, cls).__new__(cls, min_gap, max_gap,
+                                                   max_window)
+
+    @property
+    def gap_range(self):
+        """
+        Get range of gaps between consecutive itemsets (following itemset
+        has greater eid, i.e. the minimum gap is at least 1).
+
+        @return: The minimum gap and the maximum gap (None if not bounded).
+        @rtype: tuple
+        """
+        return max(self.min_gap or 1, 1), self.max_gap
+
+    def __nonzero__(self):
+        return any([x is not None for x in self])
+
+
+def subtract_items(items, id_list):
+    """
+    Generator of (sid, eids) pairs without events of the defined id-list.
+
+    @param items: Pairs of sid and sorted eids ordered by sid.
+    @type items: iterable
+    @param id_list: IdList object (events to exclude).
+    @type id_list: IdList
+    @return: Sequence id and corresponding event ids.
+    @rtype: tuple
+    """
+    items_j = id_list.items()
+    sid_j, eids_j = next(items_j, (None, ()))
+    for sid, eids in items:
+        while sid_j is not None and sid_j < sid:
+            sid_j, eids_j = next(items_j, (None, ()))
+        if sid_j == sid:
+            excluded_eids = set(eids_j)
+            eids = [x for x in eids if x not in excluded_eids]
+        if eids:
+            yield sid, eids
+
+
+class IdList(object):
+
+    """Base class of id-list (set of events, i.e. pairs of sid and eid)."""
+
+    __slots__ = ()
+
+    def new(self):
+        """
+        Create empty id-list of the same representation.
+
+        @return: IdList object.
+        @rtype: IdList
+        """
+        return self.__class__()
+
+    def new_from(self, items):
+        """
+        Create id-list of the same representation with defined events.
+
+        @param items: Pairs of sid and sorted eids.
+        @type items: iterable
+        @return: IdList object.
+        @rtype: IdList
+        """
+        output = self.new()
+        for sid, eids in items:
+            output.extend(sid, eids)
+        return output
+
+    def add(self, sid, eid):
+        """
+        Add event to the id-list.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @param eid: Event id.
+        @type eid: int
+        """
+        raise NotImplementedError
+
+    def extend(self, sid, eids):
+        """
+        Add events of one sequence to the id-list.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @param eids: Sorted event ids.
+        @type eids: iterable
+        """
+        for eid in eids:
+            self.add(sid, eid)
+
+    def update(self, id_list):
+        """
+        Add events of other id-list (or of any iterable of Event objects).
+
+        @param id_list: IdList object or iterable of Event objects.
+        @type id_list: IdList/iterable
+        """
+        if isinstance(id_list, IdList):
+            for sid, eids in id_list.items():
+                self.extend(sid, eids)
+        else:
+            for event in id_list:
+                self.add(event.sid, event.eid)
+
+    def common_items(self, id_list):
+        """
+        Generator of (sid, eids_i, eids_j) for sids present in both id-lists
+        (sort-merge walk by sid).
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @return: Sequence id and event ids of both id-lists.
+        @rtype: tuple
+        """
+        items_i, items_j = self.items(), id_list.items()
+        try:
+            sid_i, eids_i = next(items_i)
+            sid_j, eids_j = next(items_j)
+            while True:
+                if sid_i < sid_j:
+                    sid_i, eids_i = next(items_i)
+                elif sid_i > sid_j:
+                    sid_j, eids_j = next(items_j)
+                else:
+                    yield sid_i, eids_i, eids_j
+                    sid_i, eids_i = next(items_i)
+                    sid_j, eids_j = next(items_j)
+        except StopIteration:
+            pass
+
+    def equal_join(self, id_list):
+        """
+        Get events that are present in both id-lists (same sid and eid).
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @return: New id-list.
+        @rtype: IdList
+        """
+        output = self.new()
+        for sid, eids_i, eids_j in self.common_items(id_list):
+            idx_i, idx_j, eids = 0, 0, []
+            while idx_i < len(eids_i) and idx_j < len(eids_j):
+                if eids_i[idx_i] < eids_j[idx_j]:
+                    idx_i += 1
+                elif eids_i[idx_i] > eids_j[idx_j]:
+                    idx_j += 1
+                else:
+                    eids.append(eids_i[idx_i])
+                    idx_i += 1
+                    idx_j += 1
+            if eids:
+                output.extend(sid, eids)
+        return output
+
+    def temporal_join(self, id_list, constraints=None):
+        """
+        Get events of the other id-list that follow (within the same sid) any
+        event of the current id-list.
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @param constraints: Time constraints (gaps between events).
+        @type constraints: TimeConstraints/None
+        @return: New id-list.
+        @rtype: IdList
+        """
+        output = self.new()
+        if constraints:
+            min_gap, max_gap = constraints.gap_range
+            for sid, eids_i, eids_j in self.common_items(id_list):
+                eids = []
+                for eid in eids_j:
+                    # the closest preceding event is the one to check
+                    idx = bisect_right(eids_i, eid - min_gap)
+                    if idx and (max_gap is None
+                                or eid - eids_i[idx - 1] <= max_gap):
+                        eids.append(eid)
+                if eids:
+                    output.extend(sid, eids)
+            return output
+
+        for sid, eids_i, eids_j in self.common_items(id_list):
+            idx = bisect_right(eids_j, eids_i[0])
+            if idx < len(eids_j):
+                output.extend(sid, eids_j[idx:])
+        return output
+
+    def difference(self, id_list):
+        """
+        Get events that are not present in the other id-list.
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @return: New id-list.
+        @rtype: IdList
+        """
+        return self.new_from(subtract_items(self.items(), id_list))
+
+    def union(self, id_lists):
+        """
+        Get events that are present in any of id-lists (current and others).
+
+        @param id_lists: IdList objects.
+        @type id_lists: list
+        @return: New id-list.
+        @rtype: IdList
+        """
+        events = {}
+        for id_list in [self] + list(id_lists):
+            for sid, eids in id_list.items():
+                events.setdefault(sid, set()).update(eids)
+        return self.new_from([(sid, sorted(events[sid]))
+                              for sid in sorted(events)])
+
+    def materialize(self):
+        """
+        Get id-list that keeps all its events explicitly.
+
+        @return: IdList object.
+        @rtype: IdList
+        """
+        return self
+
+    def items(self):
+        """
+        Generator of (sid, eids) pairs ordered by sid (eids are sorted).
+
+        @return: Sequence id and corresponding event ids.
+        @rtype: tuple
+        """
+        raise NotImplementedError
+
+    @property
+    def support(self):
+        """
+        Get number of distinct sids.
+
+        @return: Number of distinct sids.
+        @rtype: int
+        """
+        raise NotImplementedError
+
+    @property
+    def nbytes(self):
+        """
+        Get (estimated) number of bytes that are used to keep events.
+
+        @return: Number of bytes.
+        @rtype: int
+        """
+        raise NotImplementedError
+
+    def __iter__(self):
+        for sid, eids in self.items():
+            for eid in eids:
+                yield Event(sid=sid, eid=eid)
+
+    def __eq__(self, other):
+        if not isinstance(other, IdList):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __ne__(self, other):
+        output = self.__eq__(other)
+        return output if output is NotImplemented else not output
+
+    __hash__ = None
+
+    def __repr__(self):
+        """
+        String representation of an object.
+
+        @return: Object description.
+        @rtype: str
+        """
+        return '<%s: %s>' % (self.__class__.__name__, list(self))
+
+
+class EventSetIdList(IdList):
+
+    """Id-list represented as a set of Event objects."""
+
+    __slots__ = ('_events',)
+
+    def __init__(self):
+        """Initialization."""
+        self._events = set()
+
+    def add(self, sid, eid):
+        self._events.add(Event(sid=sid, eid=eid))
+
+    def items(self):
+        grouped_eids = {}
+        for event in self._events:
+            grouped_eids.setdefault(event.sid, []).append(event.eid)
+        for sid in sorted(grouped_eids):
+            yield sid, sorted(grouped_eids[sid])
+
+    @property
+    def support(self):
+        return len(set([x.sid for x in self._events]))
+
+    @property
+    def nbytes(self):
+        return getsizeof(self._events) + len(self._events) * EVENT_SIZE
+
+    def __len__(self):
+        return len(self._events)
+
+
+class ArrayIdList(IdList):
+
+    """
+    Id-list represented as a sorted array of sids with a sorted array of eids
+    per sid (columnar representation).
+    """
+
+    __slots__ = ('_sids', '_eids', '_size')
+
+    typecode = 'i'
+
+    def __init__(self):
+        """Initialization."""
+        self._sids = array(self.typecode)
+        self._eids = []
+        self._size = 0
+
+    def _get_eids(self, sid):
+        """
+        Get (create if needed) array of eids for the defined sid.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @return: Array of event ids.
+        @rtype: array.array
+        """
+        if not self._sids or sid > self._sids[-1]:
+            self._sids.append(sid)
+            self._eids.append(array(self.typecode))
+            return self._eids[-1]
+
+        idx = bisect_left(self._sids, sid)
+        if self._sids[idx] != sid:
+            self._sids.insert(idx, sid)
+            self._eids.insert(idx, array(self.typecode))
+        return self._eids[idx]
+
+    def add(self, sid, eid):
+        eids = self._get_eids(sid)
+        if not eids or eid > eids[-1]:
+            eids.append(eid)
+        else:
+            idx = bisect_left(eids, eid)
+            if eids[idx] == eid:
+                return
+            eids.insert(idx, eid)
+        self._size += 1
+
+    def extend(self, sid, eids):
+        current_eids = self._get_eids(sid)
+        if not current_eids:
+            current_eids.extend(eids)
+            self._size += len(current_eids)
+        else:
+            for eid in eids:
+                self.add(sid, eid)
+
+    def items(self):
+        for idx in xrange(len(self._sids)):
+            yield self._sids[idx], self._eids[idx]
+
+    @property
+    def support(self):
+        return len(self._sids)
+
+    @property
+    def nbytes(self):
+        return (ARRAY_SIZE * (len(self._eids) + 1) +
+                self._sids.itemsize * (len(self._sids) + self._size))
+
+    def __len__(self):
+        return self._size
+
+
+class WindowIdList(ArrayIdList):
+
+    """
+    Columnar id-list that keeps eid of the first event of the occurrence per
+    event (the latest start among occurrences that end with the event, it
+    defines the window of the occurrence).
+    """
+
+    __slots__ = ('_starts',)
+
+    def __init__(self):
+        """Initialization."""
+        super(WindowIdList, self).__init__()
+        self._starts = []
+
+    def _get_eids(self, sid):
+        if not self._sids or sid > self._sids[-1]:
+            self._starts.append(array(self.typecode))
+        else:
+            idx = bisect_left(self._sids, sid)
+            if self._sids[idx] != sid:
+                self._starts.insert(idx, array(self.typecode))
+        return super(WindowIdList, self)._get_eids(sid)
+
+    def add(self, sid, eid, start=None):
+        """
+        Add event to the id-list.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @param eid: Event id.
+        @type eid: int
+        @param start: Event id of the first event of the occurrence.
+        @type start: int/None
+        """
+        start = eid if start is None else start
+        eids = self._get_eids(sid)
+        starts = self._starts[bisect_left(self._sids, sid)]
+        idx = bisect_left(eids, eid)
+        if idx < len(eids) and eids[idx] == eid:
+            starts[idx] = max(starts[idx], start)
+            return
+        eids.insert(idx, eid)
+        starts.insert(idx, start)
+        self._size += 1
+
+    def extend(self, sid, eids, starts=None):
+        """
+        Add events of one sequence to the id-list.
+
+        @param sid: Sequence id.
+        @type sid: int
+        @param eids: Sorted event ids.
+        @type eids: iterable
+        @param starts: Event ids of the first events of occurrences.
+        @type starts: iterable/None
+        """
+        for idx, eid in enumerate(eids):
+            self.add(sid, eid, starts[idx] if starts is not None else None)
+
+    def update(self, id_list):
+        if isinstance(id_list, WindowIdList):
+            for sid, eids, starts in id_list.window_items():
+                self.extend(sid, eids, starts)
+        else:
+            super(WindowIdList, self).update(id_list)
+
+    def window_items(self):
+        """
+        Generator of (sid, eids, starts) ordered by sid (eids are sorted).
+
+        @return: Sequence id, event ids and eids of the first events.
+        @rtype: tuple
+        """
+        for idx in xrange(len(self._sids)):
+            yield self._sids[idx], self._eids[idx], self._starts[idx]
+
+    def common_window_items(self, id_list):
+        """
+        Generator of (sid, eids_i, starts_i, eids_j) for sids present in
+        both id-lists.
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @return: Sequence id, event ids and starts of the current id-list,
+            event ids of the other one.
+        @rtype: tuple
+        """
+        starts = dict([(x[0], x[2]) for x in self.window_items()])
+        for sid, eids_i, eids_j in self.common_items(id_list):
+            yield sid, eids_i, starts[sid], eids_j
+
+    def equal_join(self, id_list):
+        if not isinstance(id_list, WindowIdList):
+            return super(WindowIdList, self).equal_join(id_list)
+
+        # both occurrences end with the same event (the earlier start is kept)
+        starts_j = dict([(x[0], dict(zip(x[1], x[2])))
+                         for x in id_list.window_items()])
+        output = self.new()
+        for sid, eids_i, starts_i in self.window_items():
+            eid_starts = starts_j.get(sid)
+            if not eid_starts:
+                continue
+            eids, starts = [], []
+            for idx, eid in enumerate(eids_i):
+                if eid in eid_starts:
+                    eids.append(eid)
+                    starts.append(min(starts_i[idx], eid_starts[eid]))
+            if eids:
+                output.extend(sid, eids, starts)
+        return output
+
+    def temporal_join(self, id_list, constraints=None):
+        min_gap, max_gap = (constraints or TimeConstraints()).gap_range
+        max_window = constraints.max_window if constraints else None
+
+        output = self.new()
+        for sid, eids_i, starts_i, eids_j in self.common_window_items(
+                id_list):
+            eids, starts = [], []
+            # indexes of events of the gap range (both bounds only advance)
+            # with decreasing starts, the first one has the running maximum
+            candidates, idx_end = deque(), 0
+            for eid in eids_j:
+                while (idx_end < len(eids_i)
+                        and eids_i[idx_end] <= eid - min_gap):
+                    while (candidates and
+                           starts_i[candidates[-1]] <= starts_i[idx_end]):
+                        candidates.pop()
+                    candidates.append(idx_end)
+                    idx_end += 1
+                if max_gap is not None:
+                    while (candidates and
+                           eids_i[candidates[0]] < eid - max_gap):
+                        candidates.popleft()
+                if not candidates:
+                    continue
+                # the latest start gives the narrowest window
+                start = starts_i[candidates[0]]
+                if max_window is None or eid - start <= max_window:
+                    eids.append(eid)
+                    starts.append(start)
+            if eids:
+                output.extend(sid, eids, starts)
+        return output
+
+    @property
+    def nbytes(self):
+        return (super(WindowIdList, self).nbytes +
+                ARRAY_SIZE * len(self._starts) +
+                self._sids.itemsize * self._size)
+
+
+class DiffIdList(IdList):
+
+    """
+    Id-list represented as a difference (diffset) with the base id-list, i.e.
+    only events lost relative to the base are kept. The base is the union of
+    id-lists of the equivalence class (it is shared by elements of the class
+    and is not an id-list of other element, thus diffsets are not chained).
+    Joins run on the restored id-list: a temporal join keeps eids of the
+    later item, thus events of an extension are not a subset of events of
+    its prefix, and diffsets of extensions can not be derived from diffsets
+    of the class (as in dSPADE for itemsets).
+    """
+
+    __slots__ = ('base', 'diff', '_support', '_size')
+
+    def __init__(self, base, id_list):
+        """
+        Initialization.
+
+        @param base: Id-list that contains all events of the new one.
+        @type base: IdList
+        @param id_list: Id-list with events to keep.
+        @type id_list: IdList
+        """
+        self.base = base
+        self.diff = base.difference(id_list)
+        self._support = id_list.support
+        self._size = len(id_list)
+
+    def new(self):
+        return self.base.new()
+
+    def materialize(self):
+        return self.base.difference(self.diff)
+
+    def equal_join(self, id_list):
+        return self.materialize().equal_join(id_list)
+
+    def temporal_join(self, id_list, constraints=None):
+        return self.materialize().temporal_join(id_list,
+                                                constraints=constraints)
+
+    def items(self):
+        return subtract_items(self.base.items(), self.diff)
+
+    @property
+    def support(self):
+        return self._support
+
+    @property
+    def nbytes(self):
+        # the base is kept while the diffset is kept
+        return self.diff.nbytes + self.base.nbytes
+
+    def __len__(self):
+        return self._size
+
+
+def get_nbytes(id_lists):
+    """
+    Get (estimated) number of bytes that are used to keep events of id-lists
+    (base id-lists shared by diffsets are counted once).
+
+    @param id_lists: IdList objects.
+    @type id_lists: iterable
+    @return: Number of bytes.
+    @rtype: int
+    """
+    output, bases = 0, {}
+    for id_list in id_lists:
+        if isinstance(id_list, DiffIdList):
+            bases[id(id_list.base)] = id_list.base
+            output += id_list.diff.nbytes
+        else:
+            output += id_list.nbytes
+    return output + sum([x.nbytes for x in bases.itervalues()])
+
+
+class SupportIdList(IdList):
+
+    """
+    Id-list without events that keeps only support and the number of events
+    (id-list of the found sequence that is not joined anymore).
+    """
+
+    __slots__ = ('_support', '_size')
+
+    def __init__(self, support=0, size=0):
+        """
+        Initialization.
+
+        @param support: Number of distinct sids.
+        @type support: int
+        @param size: Number of events.
+        @type size: int
+        """
+        self._support = support
+        self._size = size
+
+    @classmethod
+    def from_id_list(cls, id_list):
+        """
+        Create id-list that keeps only support of the other id-list.
+
+        @param id_list: IdList object.
+        @type id_list: IdList
+        @return: SupportIdList object.
+        @rtype: SupportIdList
+        """
+        return cls(support=id_list.support, size=len(id_list))
+
+    def items(self):
+        return iter(())
+
+    @property
+    def support(self):
+        return self._support
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,616 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['SequenceIndex', 'IndexedElementDict', 'TopElementDict',
+           'TopSupportElementDict', 'ClosedElementDict', 'is_subsequence',
+           'is_subsequence_node', 'get_signature', 'is_subsequence_set']
+
+from collections import defaultdict
+from heapq import heapify, heappop, heappush
+
+from .element import ElementDict, SequenceNode
+from .idlist import SupportIdList
+
+# number of bits of bloom filters of items
+SIGNATURE_BITS = 64
+
+
+def is_subsequence(sequence_i, sequence_j, level=0):
+    """
+    Check if sequence_i is sub-sequence for sequence_j.
+
+    @param sequence_i: First sequence (i.e. possible sub-sequence).
+    @type sequence_i: tuple
+    @param sequence_j: Second sequence (i.e. master sequence)
+    @type sequence_j: tuple
+    @param level: Number of sub-tuples (possible values: 0, 1).
+    @type level: int
+    @return: Flag that the 1st sequence is sub-sequence for the 2nd one.
+    @rtype: bool
+    """
+    counter, idx_start_j = 0, 0
+    for idx_i in xrange(len(sequence_i)):
+        for idx_j in xrange(idx_start_j, len(sequence_j)):
+
+            if not level:
+                item_j = sequence_j[idx_j] if idx_i else abs(sequence_j[idx_j])
+                if sequence_i[idx_i] != item_j:
+                    continue
+
+            elif level == 1:
+                master_itemset = set(sequence_j[idx_j])
+
+                is_subitemset = True
+                for x in sequence_i[idx_i]:
+                    if x not in master_itemset:
+                        is_subitemset = False
+                        break
+
+                if not is_subitemset:
+                    continue
+
+            else:
+                break
+
+            counter += 1
+
+            idx_start_j = idx_j + 1
+            break
+
+        if (idx_i + 1) != counter:
+            break
+
+    return counter == len(sequence_i)
+
+
+def get_signature(sequences, sid_bits):
+    """
+    Get signature of sequences per sid: bitmap of sids, bloom filter of all
+    items, total length of sequences and bloom filters of items per sid.
+
+    @param sequences: Sequences of items per sid {sid: <tuple>}.
+    @type sequences: dict
+    @param sid_bits: Positions of sids in bitmaps {sid: <position>} (new sids
+        are added).
+    @type sid_bits: dict
+    @return: Signature (sids, items, length, {sid: items}).
+    @rtype: tuple
+    """
+    sids, items, length, sid_items = 0, 0, 0, {}
+    for sid, sequence in sequences.iteritems():
+        sids |= 1 << sid_bits.setdefault(sid, len(sid_bits))
+
+        sequence_items = 0
+        for item in sequence:
+            sequence_items |= 1 << (abs(item) % SIGNATURE_BITS)
+        sid_items[sid] = sequence_items
+
+        items |= sequence_items
+        length += len(sequence)
+
+    return sids, items, length, sid_items
+
+
+def is_subsequence_set(sequences_i, sequences_j, signature_i, signature_j):
+    """
+    Check if every sequence of sequences_i is sub-sequence for the sequence of
+    the same sid of sequences_j (signatures reject most of non-containment
+    cases before sequences are compared).
+
+    @param sequences_i: Possible sub-sequences per sid {sid: <tuple>}.
+    @type sequences_i: dict
+    @param sequences_j: Master sequences per sid {sid: <tuple>}.
+    @type sequences_j: dict
+    @param signature_i: Signature of sequences_i.
+    @type signature_i: tuple
+    @param signature_j: Signature of sequences_j.
+    @type signature_j: tuple
+    @return: Flag that sequences_i are sub-sequences for sequences_j.
+    @rtype: bool
+    """
+    sids_i, items_i, length_i, sid_items_i = signature_i
+    sids_j, items_j, length_j, sid_items_j = signature_j
+    if sids_i & ~sids_j or items_i & ~items_j or length_i > length_j:
+        return False
+
+    for sid, sequence in sequences_i.iteritems():
+        if (sid_items_i[sid] & ~sid_items_j[sid]
+                or not is_subsequence(sequence, sequences_j[sid])):
+            return False
+    return True
+
+
+def is_subsequence_node(node_i, node_j):
+    """
+    Check if sequence of node_i is sub-sequence for sequence of node_j (nodes
+    of the prefix trie are walked from the last itemsets, itemsets are
+    compared as sets).
+
+    @param node_i: Node of the first sequence (i.e. possible sub-sequence).
+    @type node_i: SequenceNode
+    @param node_j: Node of the second sequence (i.e. master sequence).
+    @type node_j: SequenceNode
+    @return: Flag that the 1st sequence is sub-sequence for the 2nd one.
+    @rtype: bool
+    """
+    while node_i.size:
+        if node_i.size > node_j.size:
+            return False
+        if node_i.itemset <= node_j.itemset:
+            node_i = node_i.previous
+        node_j = node_j.previous
+    return True
+
+
+def get_node(sequence):
+    """
+    Get node of the prefix trie for the sequence.
+
+    @param sequence: Sequence of itemsets or node of the prefix trie.
+    @type sequence: tuple of tuples/SequenceNode
+    @return: Node of the sequence.
+    @rtype: SequenceNode
+    """
+    if isinstance(sequence, SequenceNode):
+        return sequence
+    return SequenceNode.from_sequence(sequence)
+
+
+class SequenceIndex(object):
+
+    """
+    Class represents inverted index (item to sequences) over sequences, it is
+    used to get candidates for super-/sub-sequences of the defined sequence.
+    """
+
+    def __init__(self):
+        """Initialization."""
+        self._postings = {}
+        self._sequences = {}
+
+    def add(self, key, sequence):
+        """
+        Add sequence to the index.
+
+        @param key: Sequence key (node, sequence or item).
+        @type key: SequenceNode/tuple/type(Item)
+        @param sequence: Sequence of itemsets or node of the prefix trie.
+        @type sequence: tuple of tuples/SequenceNode
+        """
+        self.remove(key=key)
+        node = get_node(sequence)
+        items = node.items
+        self._sequences[key] = (node, items)
+        for item in items:
+            self._postings.setdefault(item, set()).add(key)
+
+    def remove(self, key):
+        """
+        Remove sequence from the index.
+
+        @param key: Sequence key (node, sequence or item).
+        @type key: SequenceNode/tuple/type(Item)
+        """
+        if key not in self._sequences:
+            return
+
+        _, items = self._sequences.pop(key)
+        for item in items:
+            self._postings[item].discard(key)
+            if not self._postings[item]:
+                del self._postings[item]
+
+    def clear(self):
+        """Clear index data."""
+        self._postings.clear()
+        self._sequences.clear()
+
+    def get_supersequences(self, sequence):
+        """
+        Get keys of indexed sequences that are super-sequences of (or equal
+        to) the defined sequence.
+
+        @param sequence: Sequence of itemsets or node of the prefix trie.
+        @type sequence: tuple of tuples/SequenceNode
+        @return: List of keys.
+        @rtype: list
+        """
+        node = get_node(sequence)
+
+        postings = []
+        for item in node.items:
+            if item not in self._postings:
+                return []
+            postings.append(self._postings[item])
+
+        if not postings:
+            return []
+
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+
+        return [key for key in candidates
+                if is_subsequence_node(node, self._sequences[key][0])]
+
+    def get_subsequences(self, sequence):
+        """
+        Get keys of indexed sequences that are sub-sequences of (or equal to)
+        the defined sequence.
+
+        @param sequence: Sequence of itemsets or node of the prefix trie.
+        @type sequence: tuple of tuples/SequenceNode
+        @return: List of keys.
+        @rtype: list
+        """
+        node = get_node(sequence)
+
+        counters = {}
+        for item in node.items:
+            for key in self._postings.get(item, ()):
+                counters[key] = counters.get(key, 0) + 1
+
+        output = []
+        for key, counter in counters.iteritems():
+            indexed_node, items = self._sequences[key]
+            if (counter == len(items)
+                    and is_subsequence_node(indexed_node, node)):
+                output.append(key)
+
+        return output
+
+    def __len__(self):
+        return len(self._sequences)
+
+
+class IndexedElementDict(ElementDict):
+
+    """Class represents dictionary of elements with index of sequences."""
+
+    def __init__(self):
+        """Initialization."""
+        super(IndexedElementDict, self).__init__()
+        self._index = SequenceIndex()
+
+    def set(self, key, element):
+        if key not in self:
+            # nodes of the prefix trie are indexed as they are
+            self._index.add(key=key, sequence=(
+                key if isinstance(key, SequenceNode) else element.sequence))
+        super(IndexedElementDict, self).set(key=key, element=element)
+
+    def remove(self, key):
+        self._index.remove(key=key)
+        super(IndexedElementDict, self).remove(key=key)
+
+    def clear(self):
+        self._index.clear()
+        super(IndexedElementDict, self).clear()
+
+    def get_supersequences(self, sequence):
+        """
+        Get keys of elements with super-sequences of the defined sequence.
+
+        @param sequence: Sequence of itemsets or node of the prefix trie.
+        @type sequence: tuple of tuples/SequenceNode
+        @return: List of keys.
+        @rtype: list
+        """
+        return self._index.get_supersequences(sequence=sequence)
+
+    def get_subsequences(self, sequence):
+        """
+        Get keys of elements with sub-sequences of the defined sequence.
+
+        @param sequence: Sequence of itemsets or node of the prefix trie.
+        @type sequence: tuple of tuples/SequenceNode
+        @return: List of keys.
+        @rtype: list
+        """
+        return self._index.get_subsequences(sequence=sequence)
+
+
+class TopElementDict(IndexedElementDict):
+
+    """
+    Class represents dictionary of elements with min-heap of ranks (sequence
+    length, sequence size, key) to keep only top longest sequences. Found
+    elements could be removed by longer ones, thus only confirmed elements
+    (that are final) define the rank for new elements to exceed.
+    """
+
+    def __init__(self):
+        """Initialization."""
+        super(TopElementDict, self).__init__()
+        self._heap = []
+        self._final_keys = set()
+        self._final_heap = []
+
+    @staticmethod
+    def get_rank(key, element):
+        """
+        Get rank of the element (the higher rank the longer sequence).
+
+        @param key: Node, sequence or item.
+        @type key: SequenceNode/tuple/type(Item)
+        @param element: Element object.
+        @type element: Element
+        @return: Sequence length, sequence size and key (nodes of the prefix
+            trie are ordered by their sequences).
+        @rtype: tuple
+        """
+        return element.sequence_length, element.sequence_size, key
+
+    def set(self, key, element):
+        if key not in self:
+            heappush(self._heap, self.get_rank(key=key, element=element))
+        super(TopElementDict, self).set(key=key, element=element)
+
+    def remove(self, key):
+        super(TopElementDict, self).remove(key=key)
+        self._final_keys.discard(key)
+        # ranks of removed elements are dropped from the heap lazily
+        if len(self._heap) > 2 * len(self) + 64:
+            self._heap = [x for x in self._heap if x[2] in self]
+            heapify(self._heap)
+
+    def clear(self):
+        self._heap = []
+        self._final_keys.clear()
+        self._final_heap = []
+        super(TopElementDict, self).clear()
+
+    def confirm(self, key):
+        """
+        Mark the element as final (it is not removed by longer elements).
+
+        @param key: Node, sequence or item.
+        @type key: SequenceNode/tuple/type(Item)
+        """
+        if key not in self._final_keys:
+            self._final_keys.add(key)
+            heappush(self._final_heap,
+                     self.get_rank(key=key, element=self.get(key)))
+
+    def get_pending_keys(self):
+        """
+        Get keys of elements that are not confirmed yet.
+
+        @return: List of keys.
+        @rtype: list
+        """
+        return [x for x in self.get_keys() if x not in self._final_keys]
+
+    def get_minimum_rank(self):
+        """
+        Get the lowest rank among the stored elements.
+
+        @return: Rank of the element.
+        @rtype: tuple/None
+        """
+        while self._heap and self._heap[0][2] not in self:
+            heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def trim(self, top_number):
+        """
+        Remove elements with ranks below the top confirmed elements.
+
+        @param top_number: The number of elements to keep.
+        @type top_number: int
+        """
+        threshold = self.get_threshold(top_number=top_number)
+        if threshold is None:
+            return
+
+        rank = self.get_minimum_rank()
+        while rank is not None and rank < threshold:
+            heappop(self._heap)
+            self._final_keys.discard(rank[2])
+            super(TopElementDict, self).remove(key=rank[2])
+            rank = self.get_minimum_rank()
+
+    def get_threshold(self, top_number):
+        """
+        Get the rank that a new element should exceed to be admitted, i.e.
+        the lowest rank among top confirmed elements.
+
+        @param top_number: The number of elements to keep.
+        @type top_number: int
+        @return: Rank of the element/None (if there are free positions).
+        @rtype: tuple/None
+        """
+        # ranks below top confirmed ones are not used anymore
+        while len(self._final_heap) > top_number:
+            heappop(self._final_heap)
+        if len(self._final_heap) < top_number:
+            return None
+        return self._final_heap[0]
+
+
+class TopSupportElementDict(ElementDict):
+
+    """
+    Class represents dictionary of elements with min-heap of supports to keep
+    elements with top supports (elements with the same support as the last
+    top element are kept as well).
+    """
+
+    def __init__(self, top_number):
+        """
+        Initialization.
+
+        @param top_number: The number of elements with the highest support.
+        @type top_number: int
+        """
+        super(TopSupportElementDict, self).__init__()
+        self.top_number = top_number
+        self._heap = []
+        self._counters = defaultdict(int)
+
+    def set(self, key, element):
+        # only node of the sequence and support are kept
+        element = element.copy(
+            id_list=SupportIdList.from_id_list(element.id_list))
+
+        self.remove(key=key)
+        heappush(self._heap, (element.support, key))
+        self._counters[element.support] += 1
+        super(TopSupportElementDict, self).set(key=key, element=element)
+
+        # remove elements with the lowest support if there are enough others
+        support = self.get_minimum_support()
+        while (support is not None
+                and len(self) - self._counters[support] >= self.top_number):
+            while self._heap and self._heap[0][0] == support:
+                _, heap_key = heappop(self._heap)
+                if self.is_actual(support=support, key=heap_key):
+                    super(TopSupportElementDict, self).remove(key=heap_key)
+            del self._counters[support]
+            support = self.get_minimum_support()
+
+    def remove(self, key):
+        if key not in self:
+            return
+
+        support = self.get(key=key).support
+        self._counters[support] -= 1
+        if not self._counters[support]:
+            del self._counters[support]
+        super(TopSupportElementDict, self).remove(key=key)
+
+        # supports of removed elements are dropped from the heap lazily
+        if len(self._heap) > 2 * len(self) + 64:
+            self._heap = [(x.support, k) for k, x in self.items()]
+            heapify(self._heap)
+
+    def clear(self):
+        self._heap = []
+        self._counters.clear()
+        super(TopSupportElementDict, self).clear()
+
+    def is_actual(self, support, key):
+        """
+        Check that the heap entry belongs to the stored element.
+
+        @param support: Support of the heap entry.
+        @type support: int
+        @param key: Key of the heap entry.
+        @type key: SequenceNode/tuple
+        @return: Flag that the element is stored with this support.
+        @rtype: bool
+        """
+        return key in self and self.get(key=key).support == support
+
+    def get_minimum_support(self):
+        """
+        Get the lowest support among the stored elements.
+
+        @return: Support value/None (if there are no elements).
+        @rtype: int/None
+        """
+        while self._heap and not self.is_actual(*self._heap[0]):
+            heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def get_threshold(self):
+        """
+        Get the support that a new element should reach to be admitted.
+
+        @return: Support value/None (if there are free positions).
+        @rtype: int/None
+        """
+        if len(self) < self.top_number:
+            return None
+        return self.get_minimum_support()
+
+
+class ClosedElementDict(ElementDict):
+
+    """
+    Class represents dictionary of closed sequences (elements without
+    super-sequences of the same support), elements are keyed by nodes of the
+    prefix trie. Sub-sequence with the same support occurs in the same
+    sequences, thus elements are indexed per support and sum of sids (only
+    sequences of the same group are compared).
+    """
+
+    def __init__(self, by_sids=True):
+        """
+        Initialization.
+
+        @param by_sids: Flag to group elements by sids too (sub-sequence with
+            the same support could occur in other sequences if support is
+            not anti-monotone, e.g. with the maximum gap).
+        @type by_sids: bool
+        """
+        super(ClosedElementDict, self).__init__()
+        self._by_sids = by_sids
+        self._indexes = {}
+        self._groups = {}
+
+    def get_group(self, element):
+        """
+        Get group of the element (support and sum of sids).
+
+        @param element: Element object.
+        @type element: Element
+        @return: Support and sum of sids.
+        @rtype: tuple
+        """
+        if not self._by_sids:
+            return element.support, None
+        return (element.support,
+                sum([sid for sid, _ in element.id_list.items()]))
+
+    def set(self, key, element):
+        if key not in self:
+            group = self._groups[key] = self.get_group(element=element)
+            self._indexes.setdefault(group, SequenceIndex()).add(
+                key=key, sequence=key)
+        super(ClosedElementDict, self).set(key=key, element=element)
+
+    def remove(self, key):
+        if key in self:
+            group = self._groups.pop(key)
+            self._indexes[group].remove(key=key)
+            if not len(self._indexes[group]):
+                del self._indexes[group]
+        super(ClosedElementDict, self).remove(key=key)
+
+    def clear(self):
+        self._indexes.clear()
+        self._groups.clear()
+        super(ClosedElementDict, self).clear()
+
+    def update(self, key, element):
+        # the key of the element is its node (sequences are not materialized)
+        node = element.node
+        if node in self:
+            return
+
+        group = self.get_group(element=element)
+        index = self._indexes.get(group)
+        if index is not None:
+            if index.get_supersequences(sequence=node):
+                return
+            for key_ in index.get_subsequences(sequence=node):
+                self.remove(key=key_)
+
+        self._groups[node] = group
+        self._indexes.setdefault(group, SequenceIndex()).add(key=node,
+                                                             sequence=node)
+        super(ClosedElementDict, self).set(key=node, element=element)
+
+    @staticmethod
+    def get_threshold():
+        return None
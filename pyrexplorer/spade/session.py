@@ -0,0 +1,323 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['MiningSession']
+
+from collections import OrderedDict
+
+from .cmap import CoOccurrenceMap
+from .element import ElementDict, Pattern
+from .index import IndexedElementDict, TopElementDict
+from .spade import SPADEm
+
+DEFAULT_CACHE_MEMORY = 64 * 2 ** 20  # bytes of cached id-lists
+
+
+class LatticeElementDict(ElementDict):
+
+    """
+    Class represents dictionary of all explored frequent sequences (objects
+    of type Pattern), elements with id-lists are passed to the session.
+    """
+
+    def __init__(self, session):
+        """
+        Initialization.
+
+        @param session: Session that keeps id-lists of elements.
+        @type session: MiningSession
+        """
+        super(LatticeElementDict, self).__init__()
+        self._session = session
+
+    def set(self, key, element):
+        self._session.cache_element(element=element)
+        super(LatticeElementDict, self).set(
+            key=key,
+            element=Pattern(sequence=element.sequence,
+                            support=element.support))
+
+    @staticmethod
+    def get_threshold():
+        return None
+
+
+class MiningSession(SPADEm):
+
+    """
+    Class represents mining session for repeated queries with different
+    parameters: all frequent sequences (lattice nodes with their supports)
+    are mined once, queries with higher minimum support or shorter maximum
+    length are answered from the lattice, id-lists of items and counters
+    of 2-sequences are kept to re-mine the lattice without data scan.
+    """
+
+    def __init__(self, cache_size=None, engine=None, strategy=None,
+                 max_memory=DEFAULT_CACHE_MEMORY):
+        """
+        Initialization.
+
+        @param cache_size: The maximum number of id-lists of deep elements
+            (k-sequences, k > 2) to keep (least recently used are evicted).
+        @type cache_size: int/None
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @param strategy: Search strategy of the lattice (DFS_STRATEGY,
+            BFS_STRATEGY or AUTO_STRATEGY).
+        @type strategy: str/None
+        @param max_memory: The maximum bytes of id-lists of deep elements to
+            keep (least recently used are evicted, None - no limit).
+        @type max_memory: int/None
+        """
+        super(MiningSession, self).__init__()
+        self._cache_size = cache_size
+        self._cache_memory = max_memory
+        self._engine = engine
+        self._strategy = strategy
+
+        self._lattice = None
+        self._lattice_parameters = None
+        self._lattice_cmap = CoOccurrenceMap()
+
+        self._base_elements = {}
+        # deep elements with bytes of their id-lists (at caching time)
+        self._deep_elements = OrderedDict()
+        self._deep_nbytes = 0
+
+    def set(self, **kwargs):
+        super(MiningSession, self).set(**kwargs)
+        self.clear_cache()
+        if self._sequences:
+            self.init_incremental_state()
+
+    def clear_cache(self):
+        """Remove explored lattice and cached id-lists."""
+        self._lattice = None
+        self._lattice_parameters = None
+        self._lattice_cmap = CoOccurrenceMap()
+        self._base_elements.clear()
+        self._deep_elements.clear()
+        self._deep_nbytes = 0
+
+    def cache_element(self, element):
+        """
+        Keep element with its id-list (1-/2-sequences are always kept).
+
+        @param element: Element object.
+        @type element: Element
+        """
+        if element.sequence_length < 3:
+            self._base_elements[element.sequence] = element
+            return
+
+        item = self._deep_elements.pop(element.sequence, None)
+        if item is not None:
+            self._deep_nbytes -= item[1]
+
+        nbytes = element.id_list.nbytes
+        self._deep_elements[element.sequence] = (element, nbytes)
+        self._deep_nbytes += nbytes
+
+        while self._deep_elements and (
+                (self._cache_size is not None
+                 and len(self._deep_elements) > self._cache_size)
+                or (self._cache_memory is not None
+                    and self._deep_nbytes > self._cache_memory)):
+            _, (_, nbytes) = self._deep_elements.popitem(last=False)
+            self._deep_nbytes -= nbytes
+
+    def get_cached_element(self, sequence):
+        """
+        Get cached element (it becomes the most recently used one).
+
+        @param sequence: Element's sequence (item codes).
+        @type sequence: tuple of tuples
+        @return: Element object.
+        @rtype: Element/None
+        """
+        if sequence in self._base_elements:
+            return self._base_elements[sequence]
+
+        item = self._deep_elements.pop(sequence, None)
+        if item is None:
+            return None
+        self._deep_elements[sequence] = item
+        return item[0]
+
+    def get_id_list(self, sequence):
+        """
+        Get id-list of the explored frequent sequence.
+
+        @param sequence: Sequence (tuple of itemsets with items).
+        @type sequence: tuple of tuples
+        @return: IdList object (None if it is not cached).
+        @rtype: IdList/None
+        """
+        if any([x not in self._encoder for itemset in sequence
+                for x in itemset]):
+            return None
+
+        element = self.get_cached_element(sequence=tuple([
+            tuple([self._encoder.encode_item(x) for x in itemset])
+            for itemset in sequence]))
+        return element.id_list if element is not None else None
+
+    def mine_lattice(self, minimum_support, max_length=None):
+        """
+        Explore all frequent sequences (lattice nodes with their supports).
+
+        @param minimum_support: Minimum support.
+        @type minimum_support: int
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        """
+        self.clear_cache()
+
+        self._frequent_elementdict.clear()
+        self._cmap.clear()
+
+        self._minimum_support = minimum_support
+        self._top_support_elementdict = LatticeElementDict(session=self)
+
+        try:
+            _, freq_2s_elementdict = self.generate_frequent_sequences(
+                max_length=max_length, engine=self._engine)
+
+            if (len(freq_2s_elementdict)
+                    and (max_length is None or max_length > 2)):
+                self.search(
+                    grouped_elements=self.grouped_by_prefix(
+                        elements=freq_2s_elementdict.get_elements()),
+                    max_length=max_length,
+                    maximal=False,
+                    strategy=self.get_strategy(strategy=self._strategy,
+                                               max_length=max_length))
+
+            self._lattice = self._top_support_elementdict
+
+        finally:
+            self._top_support_elementdict = None
+
+        self._lattice_parameters = (minimum_support, max_length)
+        self._lattice_cmap = self._cmap.copy()
+
+    def extend_lattice(self, max_length=None):
+        """
+        Explore longer frequent sequences starting from the longest explored
+        ones (all of them should have cached id-lists).
+
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @return: Flag that the lattice is extended.
+        @rtype: bool
+        """
+        minimum_support, lattice_max_length = self._lattice_parameters
+        if lattice_max_length < 3:
+            return False
+
+        frontier_elements = []
+        # the lattice is keyed by nodes, cached elements by sequences
+        for pattern in self._lattice.get_elements():
+            if pattern.sequence_length != lattice_max_length:
+                continue
+            element = self.get_cached_element(sequence=pattern.sequence)
+            if element is None:
+                return False
+            frontier_elements.append(element)
+
+        self._cmap = self._lattice_cmap
+        self._minimum_support = minimum_support
+        self._top_support_elementdict = self._lattice
+
+        try:
+            if frontier_elements:
+                self.search(
+                    grouped_elements=self.grouped_by_prefix(
+                        elements=frontier_elements),
+                    max_length=max_length,
+                    maximal=False,
+                    strategy=self.get_strategy(strategy=self._strategy,
+                                               max_length=max_length))
+        finally:
+            self._top_support_elementdict = None
+
+        self._lattice_parameters = (minimum_support, max_length)
+        return True
+
+    def query(self, minimum_support, max_length=None, top_number=None,
+              sort=False):
+        """
+        Get maximal frequent sequences, the lattice is re-mined only if it
+        does not cover the query (lower minimum support or longer maximum
+        length than explored before). Maximal sequences are selected among
+        all frequent sequences of the lattice.
+
+        @param minimum_support: Minimum support (number of distinct sids).
+        @type minimum_support: int
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param top_number: The number of top longest output sequences.
+        @type top_number: int/None
+        @param sort: Flag to sort the output base on sequence length.
+        @type sort: bool
+        @return: List of frequent sequences (objects of type Pattern).
+        @rtype: list
+        """
+        if self._lattice_parameters is None:
+            self.mine_lattice(minimum_support=minimum_support,
+                              max_length=max_length)
+
+        lattice_support, lattice_max_length = self._lattice_parameters
+        is_longer = (lattice_max_length is not None
+                     and (max_length is None
+                          or max_length > lattice_max_length))
+
+        if minimum_support < lattice_support:
+            # new lattice covers previous queries as well
+            self.mine_lattice(
+                minimum_support=minimum_support,
+                max_length=(max(max_length, lattice_max_length)
+                            if max_length and lattice_max_length else None))
+        elif is_longer and not self.extend_lattice(max_length=max_length):
+            self.mine_lattice(minimum_support=lattice_support,
+                              max_length=max_length)
+
+        patterns = [x for x in self._lattice.get_elements()
+                    if x.support >= minimum_support
+                    and (max_length is None
+                         or x.sequence_length <= max_length)]
+        patterns.sort(key=lambda x: x.sequence_length, reverse=True)
+
+        # supersequences are longer, thus they are checked before
+        maximal_patterns = IndexedElementDict()
+        for pattern in patterns:
+            if not maximal_patterns.get_supersequences(
+                    sequence=pattern.sequence):
+                maximal_patterns[pattern.sequence] = pattern
+
+        if top_number:
+            top_patterns = TopElementDict()
+            for sequence, pattern in maximal_patterns.items():
+                top_patterns[sequence] = pattern
+                # maximal patterns of the lattice are final
+                top_patterns.confirm(key=sequence)
+                top_patterns.trim(top_number=top_number)
+            maximal_patterns = top_patterns
+
+        output = maximal_patterns.get_elements()
+        if sort:
+            output.sort(key=lambda x: (x.sequence_length,
+                                       x.sequence_size,
+                                       x.sequence))
+
+        return map(self.decode, output)
@@ -11,59 +11,84 @@
 # - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
 #
 
-__all__ = ['SPADEm']
+__all__ = ['SPADEm', 'IDLIST_ENGINE', 'BITMAP_ENGINE',
+           'DFS_STRATEGY', 'BFS_STRATEGY', 'AUTO_STRATEGY']
 
 from collections import defaultdict, deque
+from heapq import nlargest
+from multiprocessing import Pool
 
-from .element import Element, ElementDict, EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE
+from .bitmap import BitmapLayout, BitmapIdList
+from .cmap import CoOccurrenceMap, get_items_mask
+from .element import (Element, ElementDict, Pattern, SequenceNode,
+                      EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE)
+from .encoder import ItemEncoder
+from .idlist import (ArrayIdList, DiffIdList, SupportIdList, TimeConstraints,
+                     WindowIdList)
+from .index import (ClosedElementDict, IndexedElementDict, TopElementDict,
+                    TopSupportElementDict, get_signature, is_subsequence_node,
+                    is_subsequence_set)
+from .spill import SpillStore, SpilledIdList
+from .vertical import ArrayDatabase
 
+IDLIST_ENGINE = 'idlist'
+BITMAP_ENGINE = 'bitmap'
 
-def is_subsequence(sequence_i, sequence_j, level=0):
-    """
-    Check if sequence_i is sub-sequence for sequence_j.
-
-    @param sequence_i: First sequence (i.e. possible sub-sequence).
-    @type sequence_i: tuple
-    @param sequence_j: Second sequence (i.e. master sequence)
-    @type sequence_j: tuple
-    @param level: Number of sub-tuples (possible values: 0, 1).
-    @type level: int
-    @return: Flag that the 1st sequence is sub-sequence for the 2nd one.
-    @rtype: bool
-    """
-    counter, idx_start_j = 0, 0
-    for idx_i in xrange(len(sequence_i)):
-        for idx_j in xrange(idx_start_j, len(sequence_j)):
+DFS_STRATEGY = 'dfs'
+BFS_STRATEGY = 'bfs'
+AUTO_STRATEGY = 'auto'
 
-            if not level:
-                item_j = sequence_j[idx_j] if idx_i else abs(sequence_j[idx_j])
-                if sequence_i[idx_i] != item_j:
-                    continue
+# the maximum length of frequent sequences (upper bound by lengths of input
+# sequences) to search them breadth-first with AUTO_STRATEGY
+AUTO_BFS_MAX_LENGTH = 6
 
-            elif level == 1:
-                master_itemset = set(sequence_j[idx_j])
-
-                is_subitemset = True
-                for x in sequence_i[idx_i]:
-                    if x not in master_itemset:
-                        is_subitemset = False
-                        break
-
-                if not is_subitemset:
-                    continue
-
-            else:
-                break
 
-            counter += 1
+_worker_spadem = None
+_worker_parameters = {}
 
-            idx_start_j = idx_j + 1
-            break
 
-        if (idx_i + 1) != counter:
-            break
+def _init_worker(minimum_support, cmap, max_length, diffset_support,
+                 max_memory, constraints=None, item_id_lists=None):
+    """
+    Initialize worker process of the parallel search.
+
+    @param minimum_support: Minimum support (number of distinct sids).
+    @type minimum_support: int
+    @param cmap: Co-occurrence Map.
+    @type cmap: CoOccurrenceMap
+    @param max_length: The maximum length of sequential patterns.
+    @type max_length: int/None
+    @param diffset_support: Class's support for diffsets.
+    @type diffset_support: float/None
+    @param max_memory: Memory budget for id-lists of pending classes.
+    @type max_memory: int/None
+    @param constraints: Time constraints (gaps and window).
+    @type constraints: TimeConstraints/None
+    @param item_id_lists: Id-lists of items (for the maximum gap).
+    @type item_id_lists: dict/None
+    """
+    global _worker_spadem
+    _worker_spadem = SPADEm()
+    _worker_spadem._minimum_support = minimum_support
+    _worker_spadem._cmap = cmap
+    _worker_spadem._constraints = constraints
+    _worker_spadem._item_id_lists = item_id_lists
+    if max_memory:
+        _worker_spadem._spill_store = SpillStore(max_memory=max_memory)
+    _worker_parameters.update(max_length=max_length,
+                              diffset_support=diffset_support)
+
+
+def _search_class(data):
+    """
+    Search frequent sequences of one equivalence class (worker process).
 
-    return counter == len(sequence_i)
+    @param data: Group of elements (equivalence class).
+    @type data: dict
+    @return: Found sequences (pairs of master elements and inner elements).
+    @rtype: list
+    """
+    return _worker_spadem.search_class(data=data, **_worker_parameters)
 
 
 class SPADEm(object):
@@ -72,9 +97,20 @@ class SPADEm(object):
         """Initialization."""
         self._sequences = {}
         self._minimum_support = None
-
-        self._cmap = {}
-        self._frequent_elementdict = ElementDict()
+        self._id_list_type = ArrayIdList
+        self._encoder = None
+        self._database = None
+        self._incremental = None
+        self._sequence_lengths = {}
+
+        self._cmap = CoOccurrenceMap()
+        self._frequent_elementdict = TopElementDict()
+        self._top_support_elementdict = None
+        self._spill_store = None
+        self._records = False
+        self._constraints = None
+        self._item_id_lists = None
+        self._closed_index = None
 
     def set(self, **kwargs):
         """
@@ -85,28 +121,74 @@ class SPADEm(object):
 
         @keyword sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
         @keyword minimum_support: Minimum support (number of distinct sids).
+        @keyword id_list_type: Class of id-list representation (IdList).
+        @keyword encoder: Prebuilt encoder of items (ItemEncoder), otherwise
+            items are encoded in their sorted order.
+        @keyword database: Vertical database (VerticalDatabase) to use instead
+            of the dictionary of sequences.
+        @keyword columns: Parallel arrays (sids, eids, items) or a buffer of
+            packed integer triples (sid, eid, item) to build vertical id-lists
+            directly (without the dictionary of sequences).
         """
         if isinstance(kwargs.get('sequences'), dict):
-            self._sequences = kwargs['sequences']
+            self._encoder = (kwargs.get('encoder') or
+                             ItemEncoder.from_sequences(kwargs['sequences']))
+            self._sequences = self._encoder.encode_sequences(
+                kwargs['sequences'])
+            self._database = None
+        elif (kwargs.get('database') is not None
+                or kwargs.get('columns') is not None):
+            self._database = kwargs.get('database')
+            if self._database is None:
+                if isinstance(kwargs['columns'], tuple):
+                    self._database = ArrayDatabase.from_columns(
+                        *kwargs['columns'], encoder=kwargs.get('encoder'))
+                else:
+                    self._database = ArrayDatabase.from_buffer(
+                        kwargs['columns'], encoder=kwargs.get('encoder'))
+            self._encoder = self._database.encoder
+            self._sequences = {}
         self._minimum_support = kwargs.get('minimum_support')
+        self._id_list_type = kwargs.get('id_list_type') or ArrayIdList
+        self._incremental = None
+
+    def decode(self, element):
+        """
+        Get element (or pattern) with decoded items (mining runs on codes).
+
+        @param element: Element object or Pattern object.
+        @type element: Element/Pattern
+        @return: Element object or Pattern object with items.
+        @rtype: Element/Pattern
+        """
+        sequence = self._encoder.decode_sequence(element.sequence)
+        if isinstance(element, Pattern):
+            return Pattern(
+                sequence=sequence,
+                support=element.support,
+                occurrences=element.occurrences)
+
+        # decoded itemsets are sorted, thus the key item is the last one
+        prefix = sequence[:-1]
+        if len(sequence[-1]) > 1:
+            prefix += (sequence[-1][:-1],)
+        return Element(
+            item=sequence[-1][-1],
+            prefix=prefix or None,
+            conn_type=element.conn_type,
+            id_list=element.id_list)
 
     def is_maximal_sequence(self, element_sequence):
         """
         Check that element's sequence is maximal frequent sequence.
 
-        @param element_sequence: Element's sequence.
-        @type element_sequence: tuple of tuples
+        @param element_sequence: Element's node of the prefix trie.
+        @type element_sequence: SequenceNode
         @return: Flag that element's seq is not sub-seq for any frequent seq.
         @rtype: bool
         """
-        output = True
-
-        for sequence, _ in self._frequent_elementdict.items():
-            if is_subsequence(element_sequence, sequence, level=1):
-                output = False
-                break
-
-        return output
+        return not self._frequent_elementdict.get_supersequences(
+            sequence=element_sequence)
 
     def add_elements(self, elementdict, top_number=None):
         """
@@ -117,19 +199,218 @@ class SPADEm(object):
         @param top_number: The number of top longest output frequent sequences.
         @type top_number: int/None
         """
-        for sequence, element in elementdict.items():
+        for _, element in elementdict.items():
+            # found sequences are keyed by nodes of the prefix trie
+            sequence = element.node
+            if self._records or self._spill_store is not None:
+                # found sequences keep only support (the same sequence has
+                # the same id-list, thus there is nothing to merge)
+                if sequence in self._frequent_elementdict:
+                    continue
+                if self._records:
+                    element = Pattern.from_element(element)
+                else:
+                    element.id_list = SupportIdList.from_id_list(
+                        element.id_list)
             self._frequent_elementdict.update(key=sequence, element=element)
+            if top_number:
+                self._frequent_elementdict.trim(top_number=top_number)
 
-        if top_number and len(self._frequent_elementdict) > top_number:
+    def add_frequent_elements(self, elements):
+        """
+        Add frequent elements to the dictionary of elements with top supports
+        and raise minimum support up to the lowest support of top elements.
 
-            sequences = []
-            for sequence, element in self._frequent_elementdict.items():
-                sequences.append((element.sequence_length,
-                                  element.sequence_size,
-                                  sequence))
-            sequences.sort(reverse=True)
-            for sequence in set([x[2] for x in sequences[top_number:]]):
-                self._frequent_elementdict.remove(key=sequence)
+        @param elements: List of Element objects.
+        @type elements: list
+        """
+        for element in elements:
+            if element.support < self._minimum_support:
+                continue
+            self._top_support_elementdict.update(key=element.node,
+                                                 element=element)
+
+        threshold = self._top_support_elementdict.get_threshold()
+        if threshold is not None and threshold > self._minimum_support:
+            self._minimum_support = threshold
+
+    def is_redundant_element(self, element):
+        """
+        Check that element's sequence is sub-sequence of explored sequence
+        with the same id-list (early termination of CloSpan/BIDE): every
+        extension of the element has super-sequence with the same support,
+        thus no closed sequence starts with element's sequence. Element is
+        registered as explored one.
+
+        @param element: Element object.
+        @type element: Element
+        @return: Flag that extensions of the element are not closed.
+        @rtype: bool
+        """
+        id_list = element.id_list
+
+        key = [id_list.support, len(id_list), 0, 0]
+        for sid, eids in id_list.items():
+            key[2] += sid * eids[0]
+            key[3] += eids[-1]
+        nodes = self._closed_index.setdefault(tuple(key), [])
+
+        output = False
+        for node, id_list_ in nodes:
+            if (is_subsequence_node(element.node, node)
+                    and id_list_ == id_list):
+                output = True
+                break
+
+        nodes.append((element.node, id_list))
+        return output
+
+    def get_length_bound(self, elements):
+        """
+        Get upper bound of length of sequences that could be produced from
+        the elements (i.e. the length that minimum support of sequences with
+        the largest number of frequent items allows).
+
+        @param elements: List of Element objects (and None values).
+        @type elements: list
+        @return: The maximum length of sequential patterns.
+        @rtype: int
+        """
+        output = 0
+        for element in elements:
+            if element is None:
+                continue
+            lengths = nlargest(self._minimum_support,
+                               [self._sequence_lengths[sid]
+                                for sid, _ in element.id_list.items()])
+            output = max(output, lengths[-1])
+        return output
+
+    def is_apriori_pruning(self):
+        """
+        Check that every sub-sequence of frequent sequence is frequent and is
+        explored (sequences are not skipped by early termination of closed
+        sequences, the maximum gap is not set).
+
+        @return: Flag that candidates could be pruned by sub-sequences.
+        @rtype: bool
+        """
+        return (self._closed_index is None
+                and not (self._constraints and self._constraints.max_gap))
+
+    def get_strategy(self, strategy=None, max_length=None, maximal=False):
+        """
+        Get search strategy of the run, AUTO_STRATEGY picks breadth-first
+        search if frequent sequences are short (upper bound by the length of
+        input sequences with minimum support), i.e. a level of equivalence
+        classes is kept in memory to prune candidates before joins.
+
+        @param strategy: Search strategy (DFS_STRATEGY, BFS_STRATEGY or
+            AUTO_STRATEGY).
+        @type strategy: str/None
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param maximal: Flag of the search of maximal sequences.
+        @type maximal: bool
+        @return: DFS_STRATEGY or BFS_STRATEGY.
+        @rtype: str
+        """
+        if strategy in (None, DFS_STRATEGY):
+            return DFS_STRATEGY
+        elif strategy not in (BFS_STRATEGY, AUTO_STRATEGY):
+            raise Exception('Unknown search strategy: %s' % strategy)
+
+        if maximal:
+            # classes of maximal sequences are filtered by prefixes of found
+            # sequences in the depth-first order (level-wise search of all
+            # frequent sequences would give other maximal sequences)
+            raise Exception('Breadth-first search of maximal sequences '
+                            'is not supported')
+
+        if strategy == BFS_STRATEGY:
+            if self._spill_store is not None:
+                raise Exception('Breadth-first search does not support '
+                                'the memory budget')
+            return BFS_STRATEGY
+
+        if self._spill_store is not None or not self.is_apriori_pruning():
+            return DFS_STRATEGY
+
+        lengths = nlargest(self._minimum_support,
+                           self._sequence_lengths.itervalues())
+        length_bound = (lengths[-1]
+                        if len(lengths) == self._minimum_support else 0)
+        if max_length:
+            length_bound = min(length_bound, max_length)
+        return (BFS_STRATEGY if length_bound <= AUTO_BFS_MAX_LENGTH
+                else DFS_STRATEGY)
+
+    @staticmethod
+    def is_apriori_candidate(item, prefix, conn_type, level_nodes):
+        """
+        Check that sub-sequences of the new sequence (prefix extended by
+        item) without one of its items are frequent (sub-sequences without
+        the last item or the last item of the prefix are joined elements).
+        Sub-sequences are walked over nodes of frequent sequences.
+
+        @param item: Key item of the new sequence.
+        @type item: type(Item)
+        @param prefix: Node of the prefix.
+        @type prefix: SequenceNode
+        @param conn_type: Type of atom (how prefix connects to the item).
+        @type conn_type: int
+        @param level_nodes: Nodes of frequent sequences of prefix's length
+            (and of their prefixes) keyed by parent, event flag and item.
+        @type level_nodes: dict
+        @return: Flag that the new sequence could be frequent.
+        @rtype: bool
+        """
+        # items of the new sequence with flags that they are added to the
+        # itemset of the previous item
+        nodes, node = [], prefix
+        while node.parent is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        steps = [(x.size == x.parent.size, x.item) for x in nodes]
+        steps.append((conn_type == EVENT_ATOM_TYPE, item))
+
+        # positions of the last two items are not checked
+        for idx in xrange(len(steps) - 3, -1, -1):
+            node = nodes[idx].parent
+            for step_idx in xrange(idx + 1, len(steps)):
+                is_event, step_item = steps[step_idx]
+                if step_idx == idx + 1 and not steps[idx][0]:
+                    # the item starts the itemset of the removed item
+                    is_event = False
+                node = level_nodes.get((node, is_event, step_item))
+                if node is None:
+                    return False
+
+        return True
+
+    @staticmethod
+    def get_level_nodes(elements):
+        """
+        Get nodes of elements' sequences and of their prefixes keyed by
+        parent node, flag that the item is added to the last itemset of the
+        parent and item (i.e. children of the prefix trie).
+
+        @param elements: List of Element objects.
+        @type elements: list
+        @return: Nodes of the prefix trie.
+        @rtype: dict
+        """
+        output = {}
+        for element in elements:
+            node = element.node
+            while node.parent is not None:
+                key = (node.parent, node.size == node.parent.size, node.item)
+                if key in output:
+                    break
+                output[key] = node
+                node = node.parent
+        return output
 
     def grouped(self, elements):
         """
@@ -147,25 +428,25 @@ class SPADEm(object):
             element = elements.pop()
 
             min_eids = {}
-            for event in element.id_list:
-                min_eid = min_eids.setdefault(event.sid, event.eid)
-                if event.eid < min_eid:
-                    min_eids[event.sid] = event.eid
+            for sid, eids in element.id_list.items():
+                min_eids[sid] = eids[0]
 
-            prefix_min_eids = prefixes.setdefault(element.prefix, {})
+            prefix = element.node.parent
+            prefix_min_eids = prefixes.setdefault(prefix, {})
             for sid, eid in min_eids.iteritems():
                 min_eid = prefix_min_eids.setdefault(sid, eid)
                 if eid < min_eid:
                     prefix_min_eids[sid] = eid
 
-            grouped_elements.setdefault(element.prefix, []).append(
+            grouped_elements.setdefault(prefix, []).append(
                 (element, tuple(sorted(min_eids.items()))))
 
-        grouped_maximum_sequences = deque([])
+        # sequences per sid of retained prefixes with their signatures
+        grouped_maximum_sequences, sid_bits = deque([]), {}
         for prefix, prefix_eids in sorted(prefixes.items(),
                                           key=lambda e: (sum(e[1].values()),
                                                          min(e[1].values()),
-                                                         len(e[0]),
+                                                         e[0].size,
                                                          e[0])):
             # filter prefixes
             if len(prefixes) > 1:
@@ -179,45 +460,43 @@ class SPADEm(object):
                 sequences_per_sid = {}
                 for sid in sid_parameters.keys():
                     sequences_per_sid[sid] = tuple(
-                        [prefix[-1][-1]] +
+                        [prefix.item] +
                         [(-x[2] if x[1] == SEQUENCE_ATOM_TYPE else x[2])
                          for x in sorted(sid_parameters[sid])]
                     )
                     del sid_parameters[sid]
 
-                for _ in xrange(len(grouped_maximum_sequences)):
-                    grouped_sequences = grouped_maximum_sequences[0]
+                signature = get_signature(sequences=sequences_per_sid,
+                                          sid_bits=sid_bits)
 
-                    skip_sequences_set = False
-                    for sid in grouped_sequences:
-                        if not is_subsequence(grouped_sequences[sid],
-                                              sequences_per_sid.get(sid, ())):
-                            skip_sequences_set = True
-                            break
+                for _ in xrange(len(grouped_maximum_sequences)):
+                    grouped_sequences, grouped_signature = \
+                        grouped_maximum_sequences[0]
 
-                    if skip_sequences_set:
-                        grouped_maximum_sequences.rotate(-1)
-                    else:
+                    if is_subsequence_set(sequences_i=grouped_sequences,
+                                          sequences_j=sequences_per_sid,
+                                          signature_i=grouped_signature,
+                                          signature_j=signature):
                         grouped_maximum_sequences.popleft()
+                    else:
+                        grouped_maximum_sequences.rotate(-1)
 
                 skip_prefix = False
-                for grouped_sequences in grouped_maximum_sequences:
+                for grouped_sequences, grouped_signature in \
+                        grouped_maximum_sequences:
 
-                    skip_sequences_set = False
-                    for sid in sequences_per_sid:
-                        if not is_subsequence(sequences_per_sid[sid],
-                                              grouped_sequences.get(sid, ())):
-                            skip_sequences_set = True
-                            break
-
-                    if not skip_sequences_set:
+                    if is_subsequence_set(sequences_i=sequences_per_sid,
+                                          sequences_j=grouped_sequences,
+                                          signature_i=signature,
+                                          signature_j=grouped_signature):
                         skip_prefix = True
                         break
 
                 if skip_prefix:
                     continue
 
-                grouped_maximum_sequences.append(sequences_per_sid)
+                grouped_maximum_sequences.append((sequences_per_sid,
+                                                  signature))
 
             if len(grouped_elements[prefix]) == 1:
                 output.append({
@@ -253,24 +532,25 @@ class SPADEm(object):
                 elements_ = [x[0] for x in sorted(grouped_elements[prefix],
                                                   key=lambda e: e[0].key_item)]
 
+                # bitsets of key items of elements that follow idx_i
+                following_masks = [0] * (len(elements_) + 1)
+                for idx_i in xrange(len(elements_) - 1, -1, -1):
+                    following_masks[idx_i] = (
+                        following_masks[idx_i + 1]
+                        | 1 << elements_[idx_i].key_item)
+
                 idx_dict = {}
                 for idx_i in xrange(len(elements_)):
                     item = elements_[idx_i].key_item
 
-                    current_group = set()
-                    for idx_j in xrange(idx_i + 1, len(elements_)):
-                        if (elements_[idx_j].key_item
-                                in self._cmap[item][EVENT_ATOM_TYPE]):
-                            current_group.add(elements_[idx_j].key_item)
-                    current_group.add(item)
+                    # row of cmap gives all connected items at once
+                    current_group = (
+                        self._cmap.get_row(item, EVENT_ATOM_TYPE)
+                        & following_masks[idx_i + 1]) | 1 << item
 
                     skip_group = False
                     for idx in idx_dict:
-                        counter = 0
-                        for gr_item in current_group:
-                            if gr_item in idx_dict[idx]:
-                                counter += 1
-                        if counter == len(current_group):
+                        if not current_group & ~idx_dict[idx]:
                             skip_group = True
                             break
 
@@ -284,6 +564,32 @@ class SPADEm(object):
 
         return deque(output)
 
+    def grouped_by_prefix(self, elements):
+        """
+        Get Element objects grouped by equivalence class without filtering
+        (every element is a master element, i.e. all sequences are produced).
+
+        @param elements: List of Element objects.
+        @type elements: list
+        @return: Element objects grouped by equivalence class.
+        @rtype: collections.deque
+        """
+        grouped_elements = {}
+        for element in elements:
+            grouped_elements.setdefault(element.node.parent, []).append(
+                element)
+
+        output = deque([])
+        for prefix in sorted(grouped_elements):
+            output.append({
+                'idx': range(len(grouped_elements[prefix])),
+                'elements': deque(sorted(grouped_elements[prefix],
+                                         key=lambda e: (e.conn_type,
+                                                        e.key_item)))
+            })
+
+        return output
+
     def update_cmap(self, element):
         """
         Update cmap (Co-occurrence Map) with data from 2-sequence element.
@@ -291,168 +597,1156 @@ class SPADEm(object):
         @param element: Element object.
         @type element: Element
         """
-        master_item, connected_item = element.prefix[0][0], element.key_item
-        for item in [master_item, connected_item]:
-            self._cmap.setdefault(item, {EVENT_ATOM_TYPE: set(),
-                                         SEQUENCE_ATOM_TYPE: set()})
-        self._cmap[master_item][element.conn_type].add(connected_item)
+        self._cmap.add(item=element.node.parent.item,
+                       conn_type=element.conn_type,
+                       connected_item=element.key_item)
 
-    def generate_frequent_sequences(self, max_length=None):
+    def set_constraints(self, constraints, engine=None, diffset_density=None,
+                        max_memory=None):
         """
-        Compute frequent 1-sequences and 2-sequences.
+        Set time constraints of the run (they are checked on actual eids of
+        sequences by joins of id-lists).
+
+        @param constraints: Time constraints (gaps and window).
+        @type constraints: TimeConstraints/None
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @param diffset_density: Fraction of sequences for diffsets.
+        @type diffset_density: float/None
+        @param max_memory: Memory budget for id-lists of pending classes.
+        @type max_memory: int/None
+        """
+        self._item_id_lists = None
+        if not constraints:
+            self._constraints = None
+            return
+
+        if self._database is not None:
+            raise Exception('Time constraints require sequences (eids)')
+        if engine is not None and engine != IDLIST_ENGINE:
+            raise Exception('Time constraints require id-list engine')
+        if constraints.max_window is not None and (diffset_density
+                                                   or max_memory):
+            raise Exception('Window constraint is not supported with '
+                            'diffsets and memory budget')
+        if constraints.max_gap is not None and diffset_density:
+            # sequence atoms are joined with id-lists of 2-sequences, thus
+            # they are not sub-sets of the parent's id-list
+            raise Exception('Maximum gap constraint is not supported with '
+                            'diffsets')
+        self._constraints = constraints
+
+    def create_id_list(self, engine=None):
+        """
+        Create empty id-list of the representation used by the engine.
 
-        @param max_length: The maximum length of sequential patterns.
-        @type max_length: int/None
-        @return: Two ElementDicts of frequent 1- and 2-sequences respectively.
-        @rtype: tuple(ElementDict, ElementDict)
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @return: IdList object.
+        @rtype: IdList
         """
-        if not self._sequences or not self._minimum_support:
-            raise Exception('Initial sequences/support are not set')
+        if engine is None or engine == IDLIST_ENGINE:
+            if self._constraints and self._constraints.max_window is not None:
+                # occurrences keep their first events to check the window
+                return WindowIdList()
+            return self._id_list_type()
+        elif engine == BITMAP_ENGINE:
+            return BitmapIdList(
+                layout=BitmapLayout(sizes=self.get_sequence_sizes()))
+        raise Exception('Unknown engine: %s' % engine)
+
+    def get_sequence_sizes(self):
+        """
+        Get number of itemsets per sequence.
 
-        id_lists, sequences = {}, {}
+        @return: Dictionary {sid: <size>}.
+        @rtype: dict
+        """
+        if self._database is not None:
+            return self._database.sequence_sizes
+        return dict([(sid, len(self._sequences[sid]))
+                     for sid in self._sequences])
+
+    def get_vertical_id_lists(self):
+        """
+        Get id-lists of items with support not less than minimum support
+        (items of the vertical database are read only if they are frequent).
+
+        @return: Pairs of sid and eids per item {item: [(sid, eids)]}.
+        @rtype: dict
+        """
+        if self._database is not None:
+            return dict([
+                (code, self._database.get_items(code))
+                for code in self._database.get_codes()
+                if self._database.get_support(code) >= self._minimum_support])
+
+        if self._incremental is not None:
+            id_lists = self._incremental['id_lists']
+            return dict([(item, sorted(id_lists[item].items()))
+                         for item in id_lists
+                         if len(id_lists[item]) >= self._minimum_support])
+
+        id_lists = {}
         for sid in self._sequences:
-            sequences.setdefault(sid, [])
             for e_idx, eid in enumerate(sorted(self._sequences[sid])):
-                for item in sorted(set(self._sequences[sid][eid])):
+                for item in set(self._sequences[sid][eid]):
                     # use index of itemset ("e_idx") instead of actual "eid"
+                    # (time constraints are checked on actual eids)
+                    id_lists.\
+                        setdefault(item, {}).\
+                        setdefault(sid, []).\
+                        append(eid if self._constraints else e_idx)
+
+        return dict([(item, sorted(id_lists[item].items()))
+                     for item in id_lists
+                     if len(id_lists[item]) >= self._minimum_support])
+
+    def count_2_sequences(self, sequences):
+        """
+        Count support (number of distinct sids) of 2-sequences per connection
+        type. Item "a" precedes item "b" within the sequence if the first
+        occurrence of "a" is before the last occurrence of "b", thus every
+        sequence costs O(D^2) (D - number of distinct items) instead of
+        O(L^2) (L - number of item occurrences).
+
+        @param sequences: Itemsets per sequence
+            {sid: {e_idx: [<sorted itemset>]}}.
+        @type sequences: dict
+        @return: 2-sequences {(item_i, item_j, conn_type): support}.
+        @rtype: dict
+        """
+        output = defaultdict(int)
+
+        for itemsets in sequences.itervalues():
+            first_idx, last_idx, event_pairs = {}, {}, set()
+
+            for idx in sorted(itemsets):
+                f_items = itemsets[idx]
+                for item in f_items:
+                    first_idx.setdefault(item, idx)
+                    last_idx[item] = idx
+                for i in xrange(len(f_items)):
+                    for j in xrange(i + 1, len(f_items)):
+                        event_pairs.add((f_items[i], f_items[j]))
+
+            for item_i, item_j in event_pairs:
+                output[(item_i, item_j, EVENT_ATOM_TYPE)] += 1
+
+            for item_i, idx_i in first_idx.iteritems():
+                for item_j, idx_j in last_idx.iteritems():
+                    if idx_i < idx_j:
+                        output[(item_i, item_j, SEQUENCE_ATOM_TYPE)] += 1
+
+        return output
+
+    def init_incremental_state(self):
+        """
+        Create id-lists of items and counters of 2-sequences that are kept
+        between runs (generate_frequent_sequences uses them instead of
+        scanning sequences).
+        """
+        self._incremental = {'id_lists': {},
+                             'counts': defaultdict(int),
+                             'parameters': None,
+                             'logs': {}}
+        self.update_incremental_state(sids=self._sequences.keys())
+
+    def update_incremental_state(self, sids, is_removal=False):
+        """
+        Add (or remove) sequences to (from) id-lists of items and counters
+        of 2-sequences (including infrequent ones, i.e. the negative border)
+        that are kept between runs of the incremental mining.
+
+        @param sids: Sequence ids.
+        @type sids: iterable
+        @param is_removal: Flag to remove sequences.
+        @type is_removal: bool
+        """
+        id_lists = self._incremental['id_lists']
+        counts = self._incremental['counts']
+
+        sequences = {}
+        for sid in sids:
+            sequences[sid] = {}
+            for e_idx, eid in enumerate(sorted(self._sequences[sid])):
+                itemset = sorted(set(self._sequences[sid][eid]))
+                sequences[sid][e_idx] = itemset
+                if is_removal:
+                    continue
+                for item in itemset:
                     id_lists.\
                         setdefault(item, {}).\
                         setdefault(sid, []).\
                         append(e_idx)
-                    sequences[sid].append(item)
+
+            if is_removal:
+                for item in set().union(*sequences[sid].values()):
+                    del id_lists[item][sid]
+                    if not id_lists[item]:
+                        del id_lists[item]
+
+        for key, frequency in self.count_2_sequences(
+                sequences=sequences).iteritems():
+            counts[key] += -frequency if is_removal else frequency
+            if not counts[key]:
+                del counts[key]
+
+    def set_encoder(self, encoder):
+        """
+        Re-encode sequences with the other encoder of items (kept id-lists
+        and counters of 2-sequences are rebuilt, kept search results of
+        equivalence classes are dropped).
+
+        @param encoder: Encoder of items.
+        @type encoder: ItemEncoder
+        """
+        self._sequences = encoder.encode_sequences(
+            self._encoder.decode_sequences(self._sequences))
+        self._encoder = encoder
+        if self._incremental is not None:
+            self._incremental.update(id_lists={}, counts=defaultdict(int))
+            self._incremental['logs'].clear()
+            self.update_incremental_state(sids=self._sequences.keys())
+
+    def append(self, sequences):
+        """
+        Append sequences (or events to existing sequences) and re-mine
+        frequent sequences incrementally: search results of top-level
+        equivalence classes are kept between runs and only classes with
+        prefix items that appear in appended sequences are searched again
+        (requires previous call of execute with incremental=True, its
+        parameters are used).
+
+        @param sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
+        @type sequences: dict
+        @return: List of frequent sequences (elements of type Element).
+        @rtype: list
+        """
+        if self._incremental is None:
+            raise Exception('Incremental mining is not started')
+
+        items = self._encoder.get_items()
+        new_items = set([x for events in sequences.itervalues()
+                         for itemset in events.itervalues()
+                         for x in itemset if x not in self._encoder])
+        if new_items and items == sorted(items):
+            # codes follow the sorted order of items (as with full re-mine),
+            # thus new items shift codes of known ones
+            self.set_encoder(encoder=ItemEncoder(
+                items=sorted(items + list(new_items))))
+
+        sequences = self._encoder.encode_sequences(sequences)
+        affected_items = set()
+
+        existing_sids = [x for x in sequences if x in self._sequences]
+        for sid in existing_sids:
+            affected_items.update(*self._sequences[sid].values())
+        self.update_incremental_state(sids=existing_sids, is_removal=True)
+
+        for sid in sequences:
+            events = self._sequences.setdefault(sid, {})
+            for eid, itemset in sequences[sid].iteritems():
+                events[eid] = tuple(set(events.get(eid, ()) + itemset))
+                affected_items.update(itemset)
+        self.update_incremental_state(sids=sequences.keys())
+
+        logs = self._incremental['logs']
+        if self._incremental['parameters']['engine'] == BITMAP_ENGINE:
+            # bitmap layout depends on sizes of all sequences
+            logs.clear()
+        for item in affected_items:
+            logs.pop(item, None)
+
+        return self.execute(incremental=True,
+                            **self._incremental['options'])
+
+    def generate_frequent_sequences(self, max_length=None, engine=None):
+        """
+        Compute frequent 1-sequences and 2-sequences.
+
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @return: Two ElementDicts of frequent 1- and 2-sequences respectively.
+        @rtype: tuple(ElementDict, ElementDict)
+        """
+        if ((not self._sequences and self._database is None)
+                or not self._minimum_support):
+            raise Exception('Initial sequences/support are not set')
+
+        id_lists = self.get_vertical_id_lists()
 
         freq_1s_elementdict = ElementDict()
 
+        # sequences of the run are nodes of the same prefix trie
+        root = SequenceNode()
+        empty_id_list = self.create_id_list(engine=engine)
         for item in id_lists:
-            if len(id_lists[item]) < self._minimum_support:
-                continue
-            freq_1s_elementdict[item] = Element(item=item)
-            for sid in id_lists[item]:
-                for eid in id_lists[item][sid]:
-                    freq_1s_elementdict.add_event(key=item, sid=sid, eid=eid)
-
-        itemspair_frequency = defaultdict(int)
-        for items in sequences.itervalues():
-            f_items = [x for x in items if x in freq_1s_elementdict]
-            for idx_i in xrange(len(f_items)):
-                for idx_j in xrange(idx_i + 1, len(f_items)):
-                    itemspair_frequency[(f_items[idx_i], f_items[idx_j])] += 1
+            freq_1s_elementdict[item] = Element(
+                item=item,
+                prefix=root,
+                id_list=empty_id_list.new_from(id_lists[item]))
+
+        if self._constraints and self._constraints.max_gap is not None:
+            # sequence atoms are joined with events of key items
+            self._item_id_lists = dict([
+                (item, element.id_list)
+                for item, element in freq_1s_elementdict.items()])
+
+        if self._top_support_elementdict is not None:
+            self.add_frequent_elements(
+                elements=freq_1s_elementdict.get_elements())
+            for item in freq_1s_elementdict.get_keys():
+                if (freq_1s_elementdict[item].support
+                        < self._minimum_support):
+                    freq_1s_elementdict.remove(key=item)
+
+        # horizontal layout of frequent items {sid: {e_idx: [<item>]}}
+        sequences = {}
+        for item in sorted(freq_1s_elementdict.get_keys()):
+            for sid, eids in id_lists[item]:
+                itemsets = sequences.setdefault(sid, {})
+                for e_idx in eids:
+                    itemsets.setdefault(e_idx, []).append(item)
+
+        self._sequence_lengths.clear()
+        for sid, itemsets in sequences.iteritems():
+            self._sequence_lengths[sid] = sum(
+                [len(x) for x in itemsets.itervalues()])
 
         freq_2s_elementdict = ElementDict()
 
         if max_length is None or max_length > 1:
             used_freq_items = set()
+            kept_bytes = 0
 
-            for item_i, item_j in set([
-                    tuple(sorted(k)) for k, v in itemspair_frequency.iteritems()
-                    if v >= self._minimum_support]):
-
-                elementdict_ = Element.join(
-                    element_i=freq_1s_elementdict[item_i],
-                    element_j=freq_1s_elementdict[item_j]
-                )
-
-                counter = 0
-                for sequence, element in elementdict_.items():
-                    if element.support < self._minimum_support:
-                        continue
+            # the most frequent 2-sequences first (minimum support could be
+            # increased in top-k mode)
+            if self._incremental is not None:
+                counts = self._incremental['counts']
+            else:
+                counts = self.count_2_sequences(sequences=sequences)
+
+            for (item_i, item_j, conn_type), frequency in sorted(
+                    [x for x in counts.iteritems()
+                     if x[1] >= self._minimum_support],
+                    key=lambda x: x[1], reverse=True):
+
+                if frequency < self._minimum_support:
+                    break
+
+                element_i = freq_1s_elementdict[item_i]
+                element_j = freq_1s_elementdict[item_j]
+                if conn_type == EVENT_ATOM_TYPE:
+                    id_list = element_i.id_list.equal_join(element_j.id_list)
+                else:
+                    id_list = element_i.id_list.temporal_join(
+                        element_j.id_list, constraints=self._constraints)
+
+                if (self._constraints
+                        and id_list.support < self._minimum_support):
+                    # counters do not take time constraints into account
+                    continue
 
-                    if sequence not in freq_2s_elementdict:
-                        self.update_cmap(element=element)
+                element = Element(item=item_j,
+                                  prefix=element_i.node,
+                                  conn_type=conn_type,
+                                  id_list=id_list)
+
+                if self._spill_store is not None:
+                    # id-lists over the memory budget are spilled at once
+                    if (kept_bytes + id_list.nbytes
+                            > self._spill_store.max_memory):
+                        element.id_list = SpilledIdList(
+                            store=self._spill_store, id_list=id_list)
+                    else:
+                        kept_bytes += id_list.nbytes
 
-                    freq_2s_elementdict.update(key=sequence, element=element)
-                    counter += 1
+                self.update_cmap(element=element)
+                freq_2s_elementdict[element.node] = element
+                used_freq_items.update([item_i, item_j])
 
-                if counter:
-                    used_freq_items.update([item_i, item_j])
+                if self._top_support_elementdict is not None:
+                    self.add_frequent_elements(elements=[element])
 
             for item in used_freq_items:
                 freq_1s_elementdict.remove(key=item)
 
         return freq_1s_elementdict, freq_2s_elementdict
 
-    def enumerate_frequent_sequences(self, elements,
-                                     max_length=None, top_number=None):
+    def use_diffsets(self, grouped_elements, minimum_support):
         """
-        Compute frequent k-sequences (k > 2) with Depth-First Search.
+        Replace id-lists of elements of dense equivalence classes with
+        diffsets (id-lists that keep only events lost relative to the union
+        of id-lists of the class, the union is shared by the class), i.e.
+        pending classes need less memory, id-lists are restored before joins.
+
+        @param grouped_elements: Element objects grouped by equivalence class.
+        @type grouped_elements: collections.deque
+        @param minimum_support: Minimum support of the union of id-lists.
+        @type minimum_support: float
+        """
+        for data in grouped_elements:
+            elements = [x for x in data['elements'] if x is not None]
+            if len(elements) < 2:
+                continue
 
-        @param elements: List of Element objects.
-        @type elements: list
+            base = elements[0].id_list.union(
+                [x.id_list for x in elements[1:]])
+            if base.support < minimum_support:
+                continue
+
+            diffsets, nbytes = [], base.nbytes
+            for element in elements:
+                id_list = DiffIdList(base=base, id_list=element.id_list)
+                if id_list.diff.nbytes < element.id_list.nbytes:
+                    diffsets.append((element, id_list))
+                    nbytes += id_list.diff.nbytes - element.id_list.nbytes
+
+            # the base is kept only if diffsets need less memory
+            if nbytes < 0:
+                for element, id_list in diffsets:
+                    element.id_list = id_list
+
+    def add_frequent_sequences(self, master_elements, elementdict=None,
+                               top_number=None):
+        """
+        Add maximal sequences found while processing of an equivalence class.
+
+        @param master_elements: Master elements without frequent extensions.
+        @type master_elements: list
+        @param elementdict: Frequent inner elements that are not extended.
+        @type elementdict: ElementDict/None
+        @param top_number: The number of top longest output frequent sequences.
+        @type top_number: int/None
+        """
+        frequent_master_elementdict = ElementDict()
+        for element in master_elements:
+            sequence = element.node
+            if self.is_maximal_sequence(element_sequence=sequence):
+                frequent_master_elementdict[sequence] = element
+
+        if elementdict is not None and len(elementdict):
+
+            for sequence in elementdict.get_keys():
+
+                if not self.is_maximal_sequence(element_sequence=sequence):
+                    elementdict.remove(key=sequence)
+                    continue
+
+                for freq_sequence in \
+                        self._frequent_elementdict.get_subsequences(
+                            sequence=sequence):
+                    self._frequent_elementdict.remove(key=freq_sequence)
+
+            self.add_elements(elementdict=elementdict, top_number=top_number)
+
+        if len(frequent_master_elementdict):
+            self.add_elements(elementdict=frequent_master_elementdict,
+                              top_number=top_number)
+
+    def search(self, grouped_elements, max_length=None, top_number=None,
+               diffset_support=None, log=None, maximal=True, strategy=None):
+        """
+        Depth-First Search over groups of elements (equivalence classes), or
+        level-wise (Breadth-First) Search of all frequent sequences: classes
+        of k-sequences are searched before classes of (k+1)-sequences, and
+        new sequences with an infrequent k-sub-sequence are not joined.
+
+        @param grouped_elements: Element objects grouped by equivalence class.
+        @type grouped_elements: collections.deque
         @param max_length: The maximum length of sequential patterns.
         @type max_length: int/None
         @param top_number: The number of top longest output frequent sequences.
         @type top_number: int/None
+        @param diffset_support: Support of the equivalence class (union of
+            id-lists) starting from which id-lists are kept as diffsets.
+        @type diffset_support: float/None
+        @param log: List to collect found sequences instead of adding them
+            (pairs of master elements and inner ElementDict/None).
+        @type log: list/None
+        @param maximal: Flag to search maximal sequences only, otherwise all
+            frequent sequences are added with method add_frequent_elements.
+        @type maximal: bool
+        @param strategy: Search strategy (DFS_STRATEGY or BFS_STRATEGY).
+        @type strategy: str/None
         """
-        frequent_inner_elementdict = ElementDict()
-        frequent_master_elementdict = ElementDict()
+        is_breadth_first = strategy == BFS_STRATEGY
+        is_candidate, level_length = None, None
+
+        # with the maximum gap all frequent sequences are searched (maximal
+        # ones could have not frequent sub-sequences)
+        is_gap_search = self._item_id_lists is not None
+        if is_breadth_first and maximal:
+            raise Exception('Breadth-first search of maximal sequences '
+                            'is not supported')
 
-        grouped_elements = self.grouped(elements=elements)
         while grouped_elements:
 
             data = grouped_elements.popleft()
+            if self._spill_store is not None:
+                self._spill_store.pop(data=data)
+            for element in data['elements']:
+                # events of the class are restored once (its base is released)
+                if isinstance(element.id_list, DiffIdList):
+                    element.id_list = element.id_list.materialize()
             current_element_length = data['elements'][0].sequence_length
 
+            if (is_breadth_first and self.is_apriori_pruning()
+                    and current_element_length != level_length):
+                # classes of the previous level are searched, thus pending
+                # classes keep all frequent sequences of the current level
+                level_length = current_element_length
+                level_nodes = self.get_level_nodes(elements=[
+                    x for data_ in [data] + list(grouped_elements)
+                    for x in data_['elements']])
+                is_candidate = (
+                    lambda item, prefix, conn_type, nodes=level_nodes:
+                    self.is_apriori_candidate(item=item,
+                                              prefix=prefix,
+                                              conn_type=conn_type,
+                                              level_nodes=nodes))
+
+            if top_number:
+                # skip classes that can not produce top longest sequences
+                threshold = self._frequent_elementdict.get_threshold(
+                    top_number=top_number)
+                if (threshold is not None and threshold[0] >
+                        self.get_length_bound(elements=data['elements'])):
+                    continue
+
+            redundant_nodes = set()
+            if not maximal:
+                # minimum support could be increased since class creation
+                data['elements'] = deque([
+                    x for x in data['elements']
+                    if x.support >= self._minimum_support])
+                data['idx'] = range(len(data['elements']))
+                if self._closed_index is not None:
+                    # redundant elements are not extended (they are joined
+                    # as partners of other elements only)
+                    redundant_nodes = set([
+                        x.node for x in data['elements']
+                        if self.is_redundant_element(element=x)])
+                    data['idx'] = [
+                        x for x in data['idx']
+                        if data['elements'][x].node not in redundant_nodes]
+                if not data['elements']:
+                    continue
+
+            frequent_inner_elementdict = ElementDict()
+            master_elements = []
+            class_nodes = [x.node for x in data['elements']]
+
+            # inner elements that are not extended keep only support
+            release_id_lists = (
+                maximal
+                and (self._records or self._spill_store is not None)
+                and max_length is not None
+                and current_element_length + 1 == max_length)
+
             for master_idx in data['idx']:
                 master_element = data['elements'][master_idx]
 
                 counter = 0
-                for idx in xrange(len(data['elements'])):
-                    current_element = data['elements'][idx]
-
-                    if current_element is None:
+                for element in self.join_class_elements(
+                        master_element=master_element,
+                        elements=data['elements'],
+                        is_candidate=is_candidate):
+                    if element.support < self._minimum_support:
                         continue
 
-                    elementdict_ = Element.join(element_i=master_element,
-                                                element_j=current_element,
-                                                cmap=self._cmap)
-
-                    for sequence, element in elementdict_.items():
-                        if element.support < self._minimum_support:
-                            continue
+                    # the same sequence is the same node of the trie
+                    sequence = element.node
+                    if sequence.parent in redundant_nodes:
+                        continue
 
-                        frequent_inner_elementdict.update(key=sequence,
-                                                          element=element)
+                    if release_id_lists:
+                        # the same sequence has the same id-list
+                        if sequence not in frequent_inner_elementdict:
+                            element.id_list = \
+                                SupportIdList.from_id_list(element.id_list)
+                            frequent_inner_elementdict[sequence] = element
                         counter += 1
+                        continue
+
+                    frequent_inner_elementdict.update(key=sequence,
+                                                      element=element)
+                    counter += 1
 
                 if not counter:
-                    sequence = master_element.sequence
-                    if self.is_maximal_sequence(element_sequence=sequence):
-                        frequent_master_elementdict[sequence] = master_element
+                    master_elements.append(master_element)
 
                 data['elements'][master_idx] = None
 
-            if (len(frequent_inner_elementdict) > 1
+            # all joins of the class are done (id-lists of parents are
+            # dropped), nodes of new sequences are kept by elements only
+            for node in class_nodes:
+                node.clear_children()
+            data['elements'].clear()
+
+            if not maximal:
+                self.add_frequent_elements(
+                    elements=frequent_inner_elementdict.get_elements())
+            elif is_gap_search:
+                # every frequent sequence is offered to maximal sequences
+                # (maximality is checked against found ones in any order,
+                # longer sequences of the class are checked before)
+                offered_elementdict = IndexedElementDict()
+                for element in sorted(
+                        master_elements +
+                        frequent_inner_elementdict.get_elements(),
+                        key=lambda x: x.sequence_length, reverse=True):
+                    if not offered_elementdict.get_supersequences(
+                            sequence=element.node):
+                        offered_elementdict[element.node] = element
+                master_elements = []
+
+            if (len(frequent_inner_elementdict) > (
+                    1 if maximal and not is_gap_search else 0)
                     and (current_element_length + 1) != max_length):
 
-                new_grouped_elements = self.grouped(
+                new_grouped_elements = (
+                    self.grouped if maximal and not is_gap_search
+                    else self.grouped_by_prefix)(
                     elements=frequent_inner_elementdict.get_elements())
-                new_grouped_elements.extend(grouped_elements)
-                grouped_elements = new_grouped_elements
-                # new_grouped_elements.reverse()  # python >= 2.7 (!)
-                # grouped_elements.extendleft(new_grouped_elements)
+                if diffset_support is not None:
+                    self.use_diffsets(grouped_elements=new_grouped_elements,
+                                      minimum_support=diffset_support)
+                if is_breadth_first:
+                    # classes of the next level are searched after the
+                    # current level
+                    grouped_elements.extend(new_grouped_elements)
+                else:
+                    if self._spill_store is not None:
+                        self._spill_store.push(
+                            grouped_elements=new_grouped_elements)
+                    new_grouped_elements.extend(grouped_elements)
+                    grouped_elements = new_grouped_elements
+                    # new_grouped_elements.reverse()  # python >= 2.7 (!)
+                    # grouped_elements.extendleft(new_grouped_elements)
+
+                frequent_inner_elementdict = None
+
+            if not maximal:
+                continue
+
+            if is_gap_search:
+                frequent_inner_elementdict = offered_elementdict
+
+            if log is not None:
+                log.append((master_elements, frequent_inner_elementdict))
+            else:
+                self.add_frequent_sequences(
+                    master_elements=master_elements,
+                    elementdict=frequent_inner_elementdict,
+                    top_number=top_number)
+
+    def join_class_elements(self, master_element, elements,
+                            is_candidate=None):
+        """
+        Generator of new elements of the master element with elements of its
+        equivalence class (with the maximum gap sequence atoms are joined
+        with id-lists of items that follow the key item in frequent
+        2-sequences).
+
+        @param master_element: Element object.
+        @type master_element: Element
+        @param elements: Elements of the class (and None values).
+        @type elements: collections.deque
+        @param is_candidate: Function to reject new sequences before joins.
+        @type is_candidate: callable/None
+        @return: New element.
+        @rtype: Element
+        """
+        for current_element in elements:
+            if current_element is None:
+                continue
+
+            for element in Element.join_elements(
+                    element_i=master_element,
+                    element_j=current_element,
+                    cmap=self._cmap,
+                    constraints=self._constraints,
+                    sequence_atoms=self._item_id_lists is None,
+                    is_candidate=is_candidate):
+                yield element
+
+        if self._item_id_lists is not None:
+            for element in Element.join_items(
+                    element=master_element,
+                    item_id_lists=self._item_id_lists,
+                    items=self._cmap.get_items(master_element.key_item,
+                                               SEQUENCE_ATOM_TYPE),
+                    constraints=self._constraints):
+                yield element
+
+    def get_cmap_signature(self, data):
+        """
+        Get cmap entries that are used while searching of the equivalence
+        class (connections between key items of its elements).
+
+        @param data: Group of elements (equivalence class).
+        @type data: dict
+        @return: Set of connections (item, conn_type, <bitset of connected
+            items>).
+        @rtype: frozenset
+        """
+        items = set([x.key_item for x in data['elements']])
+        items_mask = get_items_mask(items=items)
+        return frozenset([
+            (item, conn_type, self._cmap.get_row(item, conn_type) & items_mask)
+            for item in items
+            for conn_type in (EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE)
+            if self._cmap.get_row(item, conn_type) & items_mask])
+
+    def search_class(self, data, max_length=None, diffset_support=None):
+        """
+        Search frequent sequences of one top-level equivalence class without
+        adding them to the found maximal sequences.
 
-            elif len(frequent_inner_elementdict):
+        @param data: Group of elements (equivalence class).
+        @type data: dict
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param diffset_support: Class's support for diffsets.
+        @type diffset_support: float/None
+        @return: Found sequences (pairs of master elements and inner elements).
+        @rtype: list
+        """
+        output = []
+        self.search(grouped_elements=deque([data]),
+                    max_length=max_length,
+                    diffset_support=diffset_support,
+                    log=output)
+        return output
 
-                for sequence in frequent_inner_elementdict.get_keys():
+    def iter_enumerate_frequent_sequences(self, elements, max_length=None,
+                                          top_number=None,
+                                          diffset_density=None, workers=None,
+                                          logs=None, closed=False,
+                                          strategy=None):
+        """
+        Compute frequent k-sequences (k > 2) with Depth-First Search, every
+        top-level equivalence class is searched completely before the next.
 
-                    if not self.is_maximal_sequence(element_sequence=sequence):
-                        frequent_inner_elementdict.remove(key=sequence)
+        @param elements: List of Element objects.
+        @type elements: list
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param top_number: The number of top longest output frequent sequences.
+        @type top_number: int/None
+        @param diffset_density: Class's support (as a fraction of sequences)
+            starting from which id-lists are kept as diffsets.
+        @type diffset_density: float/None
+        @param workers: Number of processes to mine equivalence classes.
+        @type workers: int/None
+        @param logs: Found sequences per prefix item of top-level classes
+            {prefix_item: (<cmap signature>, <log>)}, classes with valid logs
+            are not searched again (missing logs are added).
+        @type logs: dict/None
+        @param closed: Flag to search closed sequences, all frequent sequences
+            (except extensions of redundant ones) are passed to the dictionary
+            of closed sequences.
+        @type closed: bool
+        @param strategy: Search strategy of closed sequences (DFS_STRATEGY or
+            BFS_STRATEGY), maximal sequences are searched depth-first.
+        @type strategy: str/None
+        @return: Prefix items of top-level classes that are not searched yet
+            (yielded after every searched top-level class).
+        @rtype: list
+        """
+        diffset_support = None
+        if diffset_density:
+            diffset_support = (diffset_density *
+                               len(self.get_sequence_sizes()))
+
+        if closed:
+            # classes are not filtered by prefixes (found sequences are not
+            # maximal), the search is done in one process
+            grouped_elements = self.grouped_by_prefix(elements=elements)
+            if diffset_support is not None:
+                self.use_diffsets(grouped_elements=grouped_elements,
+                                  minimum_support=diffset_support)
+            self.search(grouped_elements=grouped_elements,
+                        max_length=max_length,
+                        diffset_support=diffset_support,
+                        maximal=False,
+                        strategy=strategy)
+            yield []
+            return
+
+        # classes are not filtered by prefixes with the maximum gap
+        grouped_elements = (
+            self.grouped if self._item_id_lists is None
+            else self.grouped_by_prefix)(elements=elements)
+        if diffset_support is not None:
+            self.use_diffsets(grouped_elements=grouped_elements,
+                              minimum_support=diffset_support)
+        prefix_items = [x['elements'][0].node.parent.item
+                        for x in grouped_elements]
+
+        is_parallel = workers and workers > 1 and len(grouped_elements) > 1
+
+        if logs is None and not is_parallel:
+            if self._spill_store is not None:
+                self._spill_store.push(grouped_elements=grouped_elements)
+            for idx, data in enumerate(grouped_elements):
+                self.search(grouped_elements=deque([data]),
+                            max_length=max_length,
+                            top_number=top_number,
+                            diffset_support=diffset_support)
+                if top_number:
+                    self.trim_top_sequences(
+                        top_number=top_number,
+                        prefix_items=prefix_items[idx + 1:])
+                yield prefix_items[idx + 1:]
+            return
+
+        is_cached = logs is not None
+        if not is_cached:
+            logs = {}
+
+        # search of a class depends on its elements and on cmap entries of
+        # its key items (logs of affected prefix items are removed by append)
+        signatures = [self.get_cmap_signature(data=x) if is_cached else None
+                      for x in grouped_elements]
+        for idx, prefix_item in enumerate(prefix_items):
+            if logs.get(prefix_item, (None,))[0] != signatures[idx]:
+                logs.pop(prefix_item, None)
+
+        missing_classes = [x for idx, x in enumerate(grouped_elements)
+                           if prefix_items[idx] not in logs]
+
+        pool = None
+        if is_parallel and len(missing_classes) > 1:
+            pool = Pool(processes=workers,
+                        initializer=_init_worker,
+                        initargs=(self._minimum_support, self._cmap,
+                                  max_length, diffset_support,
+                                  self._spill_store and
+                                  self._spill_store.max_memory,
+                                  self._constraints, self._item_id_lists))
+            missing_logs = pool.imap(_search_class, missing_classes)
+        else:
+            if self._spill_store is not None:
+                self._spill_store.push(grouped_elements=missing_classes)
+            missing_logs = (
+                self.search_class(data=x,
+                                  max_length=max_length,
+                                  diffset_support=diffset_support)
+                for x in missing_classes)
+
+        try:
+            # logs are replayed in the order of equivalence classes, thus
+            # maximality filtering is the same as in the sequential search
+            for idx in xrange(len(grouped_elements)):
+                if prefix_items[idx] in logs:
+                    log = logs[prefix_items[idx]][1]
+                else:
+                    log = next(missing_logs)
+                    if is_cached:
+                        logs[prefix_items[idx]] = (signatures[idx], log)
+
+                for master_elements, elementdict in log:
+                    if is_cached and elementdict is not None:
+                        # keep cached log unchanged
+                        elementdict_ = ElementDict()
+                        for sequence, element in elementdict.items():
+                            elementdict_[sequence] = element
+                        elementdict = elementdict_
+                    self.add_frequent_sequences(
+                        master_elements=master_elements,
+                        elementdict=elementdict,
+                        top_number=top_number)
+                if top_number:
+                    self.trim_top_sequences(
+                        top_number=top_number,
+                        prefix_items=prefix_items[idx + 1:])
+                yield prefix_items[idx + 1:]
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def enumerate_frequent_sequences(self, elements, max_length=None,
+                                     top_number=None, diffset_density=None,
+                                     workers=None, logs=None, closed=False,
+                                     strategy=None):
+        """
+        Compute frequent k-sequences (k > 2) with Depth-First Search.
+
+        @param elements: List of Element objects.
+        @type elements: list
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param top_number: The number of top longest output frequent sequences.
+        @type top_number: int/None
+        @param diffset_density: Class's support (as a fraction of sequences)
+            starting from which id-lists are kept as diffsets.
+        @type diffset_density: float/None
+        @param workers: Number of processes to mine equivalence classes.
+        @type workers: int/None
+        @param logs: Found sequences per prefix item of top-level classes.
+        @type logs: dict/None
+        @param closed: Flag to search closed sequences (CloSpan/BIDE-like
+            early termination prunes extensions of redundant sequences).
+        @type closed: bool
+        @param strategy: Search strategy of closed sequences.
+        @type strategy: str/None
+        """
+        for _ in self.iter_enumerate_frequent_sequences(
+                elements=elements,
+                max_length=max_length,
+                top_number=top_number,
+                diffset_density=diffset_density,
+                workers=workers,
+                logs=logs,
+                closed=closed,
+                strategy=strategy):
+            pass
+
+    def is_final_sequence(self, sequence, prefix_items):
+        """
+        Check that sequence can not be extended by equivalence classes that
+        are not searched yet (i.e. no super-sequence will be found): every
+        item of super-sequence should follow (or be the same as) its prefix
+        item in some frequent 2-sequence.
+
+        @param sequence: Element's node of the prefix trie.
+        @type sequence: SequenceNode
+        @param prefix_items: Prefix items of top-level classes to search.
+        @type prefix_items: list
+        @return: Flag that the sequence is final.
+        @rtype: bool
+        """
+        items_mask = get_items_mask(items=sequence.items)
+        for prefix_item in prefix_items:
+            connected_mask = (self._cmap.get_row(prefix_item, EVENT_ATOM_TYPE)
+                              | self._cmap.get_row(prefix_item,
+                                                   SEQUENCE_ATOM_TYPE)
+                              | 1 << prefix_item)
+            if not items_mask & ~connected_mask:
+                return False
+
+        return True
+
+    def trim_top_sequences(self, top_number, prefix_items=None):
+        """
+        Confirm found maximal sequences that are final and remove sequences
+        that rank below top_number confirmed ones.
+
+        @param top_number: The number of top longest output sequences.
+        @type top_number: int
+        @param prefix_items: Prefix items of top-level classes that are not
+            searched yet (None if the search is done).
+        @type prefix_items: list/None
+        """
+        if prefix_items is not None and self._item_id_lists is not None:
+            # with the maximum gap classes are not filtered by prefixes,
+            # thus sequences are final once the search is done
+            return
+
+        for sequence in self._frequent_elementdict.get_pending_keys():
+            if prefix_items is None or self.is_final_sequence(
+                    sequence=sequence, prefix_items=prefix_items):
+                self._frequent_elementdict.confirm(key=sequence)
+        self._frequent_elementdict.trim(top_number=top_number)
+
+    def iter_execute(self, max_length=None, top_number=None, engine=None,
+                     diffset_density=None, workers=None, records=False,
+                     max_memory=None, min_gap=None, max_gap=None,
+                     max_window=None):
+        """
+        Execute SPADE algorithm and yield every maximal frequent sequence as
+        soon as it is final (with top_number sequences are yielded at the end,
+        since longer sequences could replace found ones).
+
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param top_number: The number of top longest output sequences.
+        @type top_number: int/None
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @param diffset_density: Fraction of sequences that should support the
+            equivalence class to keep its id-lists as diffsets.
+        @type diffset_density: float/None
+        @param workers: Number of processes to mine equivalence classes.
+        @type workers: int/None
+        @param records: Flag to yield Pattern objects (sequence and support)
+            instead of Element objects (id-lists of found sequences are
+            released as soon as they are found).
+        @type records: bool
+        @param max_memory: The maximum number of bytes of id-lists of pending
+            equivalence classes to keep in memory (others are spilled to a
+            temporary file), found sequences keep only support.
+        @type max_memory: int/None
+        @param min_gap: The minimum difference of eids of consecutive
+            itemsets of sequential patterns.
+        @type min_gap: int/None
+        @param max_gap: The maximum difference of eids of consecutive
+            itemsets of sequential patterns.
+        @type max_gap: int/None
+        @param max_window: The maximum difference of eids of the last and
+            the first itemsets of sequential patterns.
+        @type max_window: int/None
+        @return: Frequent sequence.
+        @rtype: Element/Pattern
+        """
+        self._frequent_elementdict.clear()
+        self._cmap.clear()
+
+        self.set_constraints(constraints=TimeConstraints(
+                                 min_gap=min_gap,
+                                 max_gap=max_gap,
+                                 max_window=max_window),
+                             engine=engine,
+                             diffset_density=diffset_density,
+                             max_memory=max_memory)
+
+        self._spill_store = (SpillStore(max_memory=max_memory)
+                             if max_memory else None)
+        self._records = records
+        try:
+            freq_1s_elementdict, freq_2s_elementdict = \
+                self.generate_frequent_sequences(max_length=max_length,
+                                                 engine=engine)
+
+            yielded_sequences = set()
+
+            def get_output(key_, element_):
+                yielded_sequences.add(key_)
+                if isinstance(element_, Pattern):
+                    return self.decode(element_)
+                if records:
+                    return self.decode(Pattern.from_element(element_))
+                if self._spill_store is not None:
+                    element_.id_list = SupportIdList.from_id_list(
+                        element_.id_list)
+                return self.decode(element_)
+
+            if not top_number:
+                # 1-sequences are not part of any frequent 2-sequence
+                for _, element in freq_1s_elementdict.items():
+                    yield get_output(element.node, element)
+
+            if (len(freq_2s_elementdict)
+                    and (max_length is None or max_length > 2)):
+                elements = freq_2s_elementdict.get_elements()
+                # 2-sequences are kept by equivalence classes only
+                freq_2s_elementdict.clear()
+                for prefix_items in self.iter_enumerate_frequent_sequences(
+                        elements=elements,
+                        max_length=max_length,
+                        top_number=top_number,
+                        diffset_density=diffset_density,
+                        workers=workers):
+
+                    if top_number or self._item_id_lists is not None:
+                        # longer sequences could replace found ones
                         continue
 
-                    for freq_sequence in self._frequent_elementdict.get_keys():
-                        if is_subsequence(freq_sequence, sequence, level=1):
-                            self._frequent_elementdict.remove(key=freq_sequence)
+                    for sequence, element in \
+                            self._frequent_elementdict.items():
+                        if (sequence not in yielded_sequences
+                                and self.is_final_sequence(
+                                    sequence=sequence,
+                                    prefix_items=prefix_items)):
+                            yield get_output(sequence, element)
 
-                self.add_elements(elementdict=frequent_inner_elementdict,
-                                  top_number=top_number)
+            if top_number:
+                if len(freq_1s_elementdict):
+                    self.add_elements(elementdict=freq_1s_elementdict,
+                                      top_number=top_number)
+                self.trim_top_sequences(top_number=top_number)
+
+            for sequence, element in self._frequent_elementdict.items():
+                if sequence not in yielded_sequences:
+                    yield get_output(sequence, element)
+
+        finally:
+            if self._spill_store is not None:
+                self._spill_store.close()
+                self._spill_store = None
+            self._records = False
+            self.set_constraints(constraints=None)
+
+    def execute_top_support(self, top_k, sort=False, max_length=None,
+                            engine=None, diffset_density=None, strategy=None):
+        """
+        Execute SPADE algorithm to get frequent sequences (not only maximal
+        ones) with the highest support. Minimum support (defined one is used
+        as a floor) is increased during the search up to the lowest support
+        of the top sequences found so far.
+
+        @param top_k: The number of sequences with the highest support
+            (sequences with the same support as the last one are kept too).
+        @type top_k: int
+        @param sort: Flag to sort the output base on sequence length
+            (otherwise sequences are sorted by support in descending order).
+        @type sort: bool
+        @param max_length: The maximum length of sequential patterns.
+        @type max_length: int/None
+        @param engine: Mining engine (IDLIST_ENGINE or BITMAP_ENGINE).
+        @type engine: str/None
+        @param diffset_density: Fraction of sequences that should support the
+            equivalence class to keep its id-lists as diffsets.
+        @type diffset_density: float/None
+        @param strategy: Search strategy (DFS_STRATEGY, BFS_STRATEGY or
+            AUTO_STRATEGY), the output is the same.
+        @type strategy: str/None
+        @return: List of frequent sequences (objects of type Pattern).
+        @rtype: list
+        """
+        self._frequent_elementdict.clear()
+        self._cmap.clear()
 
-            if len(frequent_master_elementdict):
-                self.add_elements(elementdict=frequent_master_elementdict)
+        minimum_support = self._minimum_support
+        self._minimum_support = minimum_support or 1
+        self._top_support_elementdict = TopSupportElementDict(top_number=top_k)
+
+        try:
+            _, freq_2s_elementdict = self.generate_frequent_sequences(
+                max_length=max_length, engine=engine)
+
+            if (len(freq_2s_elementdict)
+                    and (max_length is None or max_length > 2)):
+                self.search(
+                    grouped_elements=self.grouped_by_prefix(
+                        elements=freq_2s_elementdict.get_elements()),
+                    max_length=max_length,
+                    diffset_support=(
+                        diffset_density * len(self.get_sequence_sizes())
+                        if diffset_density else None),
+                    maximal=False,
+                    strategy=self.get_strategy(strategy=strategy,
+                                               max_length=max_length))
+
+            # sequences of found elements are created for the output only
+            frequent_patterns = [
+                Pattern(sequence=x.sequence, support=x.support)
+                for x in self._top_support_elementdict.get_elements()]
+
+        finally:
+            self._minimum_support = minimum_support
+            self._top_support_elementdict = None
 
-            frequent_inner_elementdict.clear()
-            frequent_master_elementdict.clear()
+        if sort:
+            frequent_patterns.sort(key=lambda x: (x.sequence_length,
+                                                  x.sequence_size,
+                                                  x.sequence))
+        else:
+            frequent_patterns.sort(key=lambda x: (-x.support, x.sequence))
+
+        return map(self.decode, frequent_patterns)
 
-    def execute(self, sort=False, max_length=None, top_number=None):
+    def execute(self, sort=False, max_length=None, top_number=None,
+                engine=None, diffset_density=None, workers=None,
+                incremental=False, max_memory=None, records=False,
+                min_gap=None, max_gap=None, max_window=None, closed=False,
+                strategy=None):
         """
         Execute SPADE algorithm for defined data with certain minimum support.
 
@@ -462,31 +1756,162 @@ class SPADEm(object):
         @type max_length: int/None
         @param top_number: The number of top longest output sequences.
         @type top_number: int/None
-        @return: List of frequent sequences (elements of type Element).
+        @param engine: Mining engine, IDLIST_ENGINE (default) keeps id-lists
+            of events, BITMAP_ENGINE keeps bitmaps (one bit per sid and
+            itemset position) and joins them with bitwise operations.
+        @type engine: str/None
+        @param diffset_density: Fraction of sequences that should support the
+            equivalence class (union of its id-lists) to keep id-lists of
+            pending classes as diffsets, i.e. only events lost relative to
+            the union (restored before joins, disabled if None).
+        @type diffset_density: float/None
+        @param workers: Number of processes to mine equivalence classes
+            (classes of 2-sequences with the same prefix) in parallel.
+        @type workers: int/None
+        @param incremental: Flag to keep id-lists, counters of 2-sequences
+            and search results of equivalence classes for method append.
+        @type incremental: bool
+        @param max_memory: The maximum number of bytes of id-lists of pending
+            equivalence classes to keep in memory (id-lists of classes that
+            are searched last are spilled to a temporary file and are loaded
+            back on demand), found sequences keep only support.
+        @type max_memory: int/None
+        @param records: Flag to return Pattern objects (sequence, support and
+            number of occurrences) instead of Element objects (id-lists of
+            found sequences are released as soon as they are found).
+        @type records: bool
+        @param min_gap: The minimum difference of eids of consecutive
+            itemsets of sequential patterns (cSPADE, occurrences out of
+            constraints are dropped from id-lists by joins).
+        @type min_gap: int/None
+        @param max_gap: The maximum difference of eids of consecutive
+            itemsets of sequential patterns.
+        @type max_gap: int/None
+        @param max_window: The maximum difference of eids of the last and
+            the first itemsets of sequential patterns.
+        @type max_window: int/None
+        @param closed: Flag to get closed frequent sequences (no super-sequence
+            with the same support) instead of maximal ones, extensions of
+            sequences that have super-sequence with the same id-list are not
+            searched (early termination).
+        @type closed: bool
+        @param strategy: Search strategy, DFS_STRATEGY (default) searches
+            every equivalence class completely before the next one,
+            BFS_STRATEGY searches level-wise and prunes new sequences with
+            infrequent sub-sequences before joins, AUTO_STRATEGY picks one of
+            them by lengths of input sequences (both are for closed sequences
+            only, maximal sequences are searched depth-first).
+        @type strategy: str/None
+        @return: List of frequent sequences (elements of type Element or
+            Pattern).
         @rtype: list
         """
         self._frequent_elementdict.clear()
         self._cmap.clear()
 
-        freq_1s_elementdict, freq_2s_elementdict = \
-            self.generate_frequent_sequences(max_length=max_length)
-
-        if len(freq_2s_elementdict) and (max_length is None or max_length > 2):
-            self.enumerate_frequent_sequences(
-                elements=freq_2s_elementdict.get_elements(),
-                max_length=max_length,
-                top_number=top_number
-            )
+        constraints = TimeConstraints(min_gap=min_gap, max_gap=max_gap,
+                                      max_window=max_window)
+
+        logs = None
+        if incremental:
+            if self._database is not None:
+                raise Exception('Incremental mining requires sequences')
+            if constraints:
+                raise Exception('Incremental mining does not support '
+                                'time constraints')
+            if closed:
+                raise Exception('Incremental mining does not support '
+                                'closed sequences')
+
+            if self._incremental is None:
+                self.init_incremental_state()
+
+            parameters = {'minimum_support': self._minimum_support,
+                          'max_length': max_length,
+                          'engine': engine}
+            if self._incremental['parameters'] != parameters:
+                self._incremental['logs'].clear()
+
+            self._incremental.update(
+                parameters=parameters,
+                options={'sort': sort,
+                         'max_length': max_length,
+                         'top_number': top_number,
+                         'engine': engine,
+                         'diffset_density': diffset_density,
+                         'workers': workers,
+                         'max_memory': max_memory,
+                         'records': records})
+            logs = self._incremental['logs']
+
+        self.set_constraints(constraints=constraints,
+                             engine=engine,
+                             diffset_density=diffset_density,
+                             max_memory=max_memory)
+
+        if closed:
+            # frequent sequences are passed to the dictionary of closed ones,
+            # explored sequences are registered to detect redundant ones
+            # (with the maximum length or window extensions could differ)
+            self._top_support_elementdict = ClosedElementDict(
+                by_sids=max_gap is None)
+            if max_length is None and max_window is None:
+                self._closed_index = {}
+
+        self._spill_store = (SpillStore(max_memory=max_memory)
+                             if max_memory else None)
+        self._records = records
+        try:
+            freq_1s_elementdict, freq_2s_elementdict = \
+                self.generate_frequent_sequences(max_length=max_length,
+                                                 engine=engine)
+
+            if (len(freq_2s_elementdict)
+                    and (max_length is None or max_length > 2)):
+                elements = freq_2s_elementdict.get_elements()
+                # 2-sequences are kept by equivalence classes only
+                freq_2s_elementdict.clear()
+                self.enumerate_frequent_sequences(
+                    elements=elements,
+                    max_length=max_length,
+                    top_number=top_number,
+                    diffset_density=diffset_density,
+                    workers=workers,
+                    logs=logs,
+                    closed=closed,
+                    strategy=self.get_strategy(strategy=strategy,
+                                               max_length=max_length,
+                                               maximal=not closed)
+                )
 
-        if len(freq_1s_elementdict):
-            self.add_elements(elementdict=freq_1s_elementdict,
-                              top_number=top_number)
+            if closed:
+                # 1-/2-sequences are added by generate_frequent_sequences
+                self.add_elements(elementdict=self._top_support_elementdict,
+                                  top_number=top_number)
+            elif len(freq_1s_elementdict):
+                self.add_elements(elementdict=freq_1s_elementdict,
+                                  top_number=top_number)
+            if top_number:
+                self.trim_top_sequences(top_number=top_number)
+
+        finally:
+            if self._spill_store is not None:
+                self._spill_store.close()
+                self._spill_store = None
+            self._records = False
+            self.set_constraints(constraints=None)
+            self._top_support_elementdict = None
+            self._closed_index = None
 
         frequent_elements = self._frequent_elementdict.get_elements()
-        if sort:
+        if sort and records:
+            frequent_elements.sort(key=lambda x: (x.sequence_length,
+                                                  x.sequence_size,
+                                                  x.sequence))
+        elif sort:
             frequent_elements.sort(key=lambda x: (x.sequence_length,
                                                   x.sequence_size,
                                                   x.prefix,
                                                   x.key_item))
 
-        return frequent_elements
+        return map(self.decode, frequent_elements)
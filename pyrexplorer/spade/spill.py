@@ -0,0 +1,209 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+__all__ = ['SpillStore', 'SpilledIdList']
+
+import cPickle
+import tempfile
+
+from .idlist import IdList, get_nbytes
+
+
+def _restore_id_list(prototype, items):
+    """
+    Create id-list of the prototype's representation (unpickling).
+
+    @param prototype: Empty id-list.
+    @type prototype: IdList
+    @param items: Pairs of sid and sorted eids.
+    @type items: list
+    @return: IdList object.
+    @rtype: IdList
+    """
+    return prototype.new_from(items)
+
+
+class SpilledIdList(IdList):
+
+    """
+    Id-list which events are kept in the spill store (only support and the
+    number of events are kept in memory).
+    """
+
+    __slots__ = ('_store', '_position', '_prototype', '_support', '_size')
+
+    def __init__(self, store, id_list):
+        """
+        Initialization.
+
+        @param store: Store to keep events.
+        @type store: SpillStore
+        @param id_list: Id-list to spill.
+        @type id_list: IdList
+        """
+        self._store = store
+        self._position = store.dump(
+            [(sid, list(eids)) for sid, eids in id_list.items()])
+        self._prototype = id_list.new()
+        self._support = id_list.support
+        self._size = len(id_list)
+
+    def new(self):
+        return self._prototype.new()
+
+    def materialize(self):
+        return self._prototype.new_from(self._store.load(self._position))
+
+    def equal_join(self, id_list):
+        return self.materialize().equal_join(id_list)
+
+    def temporal_join(self, id_list, constraints=None):
+        return self.materialize().temporal_join(id_list,
+                                                constraints=constraints)
+
+    def items(self):
+        return iter(self._store.load(self._position))
+
+    @property
+    def support(self):
+        return self._support
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def __len__(self):
+        return self._size
+
+    def __reduce__(self):
+        # events are passed (e.g., to a worker process) explicitly
+        return _restore_id_list, (self._prototype,
+                                  self._store.load(self._position))
+
+
+class SpillStore(object):
+
+    """
+    Class represents temporary file store for id-lists of pending equivalence
+    classes: when live id-lists exceed the memory budget, id-lists of the
+    coldest classes (that are searched last) are spilled to the file and are
+    loaded back when the class is searched.
+    """
+
+    def __init__(self, max_memory):
+        """
+        Initialization.
+
+        @param max_memory: The maximum number of bytes of id-lists of pending
+            equivalence classes to keep in memory.
+        @type max_memory: int
+        """
+        self.max_memory = max_memory
+        self.live_bytes = 0
+
+        # pending classes, the last one is searched first
+        self._pending = []
+        # number of spilled classes at the bottom of the stack
+        self._spilled = 0
+
+        self._file = None
+
+    def dump(self, data):
+        """
+        Write data to the store.
+
+        @param data: Data to keep (pickled).
+        @type data: object
+        @return: Position of data in the store (offset and size).
+        @rtype: tuple
+        """
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='pyrexplorer-')
+
+        data = cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+
+    def load(self, position):
+        """
+        Read data from the store.
+
+        @param position: Position of data in the store (offset and size).
+        @type position: tuple
+        @return: Kept data.
+        @rtype: object
+        """
+        offset, size = position
+        self._file.seek(offset)
+        return cPickle.loads(self._file.read(size))
+
+    def push(self, grouped_elements):
+        """
+        Add pending equivalence classes (they are searched before the ones
+        added earlier) and spill the coldest classes if needed.
+
+        @param grouped_elements: Element objects grouped by equivalence class
+            (in order of search).
+        @type grouped_elements: iterable
+        """
+        for data in reversed(list(grouped_elements)):
+            data['nbytes'] = get_nbytes([x.id_list
+                                         for x in data['elements']
+                                         if x is not None])
+            self.live_bytes += data['nbytes']
+            self._pending.append(data)
+
+        # the last pending class (searched next) is kept in memory
+        while (self.live_bytes > self.max_memory
+                and self._spilled < len(self._pending) - 1):
+            data = self._pending[self._spilled]
+            for element in data['elements']:
+                if element is not None:
+                    element.id_list = SpilledIdList(
+                        store=self, id_list=element.id_list)
+            data['spilled'] = True
+            self.live_bytes -= data['nbytes']
+            self._spilled += 1
+
+    def pop(self, data):
+        """
+        Remove equivalence class from pending ones before its search (its
+        id-lists are loaded if they were spilled).
+
+        @param data: Group of elements (equivalence class).
+        @type data: dict
+        """
+        if self._pending and self._pending[-1] is data:
+            self._pending.pop()
+            if len(self._pending) < self._spilled:
+                self._spilled -= 1
+
+        nbytes = data.pop('nbytes', 0)
+        if not data.pop('spilled', False):
+            self.live_bytes -= nbytes
+
+        for element in data['elements']:
+            if (element is not None
+                    and isinstance(element.id_list, SpilledIdList)):
+                element.id_list = element.id_list.materialize()
+
+    def close(self):
+        """Remove pending classes and the temporary file."""
+        self._pending = []
+        self._spilled = 0
+        self.live_bytes = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
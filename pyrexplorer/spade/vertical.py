@@ -0,0 +1,454 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Authors:
+# - Mikhail Titov, <mikhail.titov@cern.ch>, 2015
+#
+
+"""
+Vertical databases: item dictionary and per-item sid/position arrays (binary
+file opened with mmap or arrays built in memory from columnar input).
+
+File layout (integers are 4-byte arrays of typecode "i" in byte order of the
+writer, which is recorded in the header):
+    - header: magic, byte order, number of sequences, number of items,
+      offsets of the item index and of the item dictionary;
+    - sids and sizes (number of itemsets) of all sequences;
+    - per item (in order of item codes): sids, number of positions per sid,
+      positions (indexes of itemsets);
+    - item index: offset, number of sids and number of positions per item;
+    - item dictionary (pickled list of items in order of item codes).
+"""
+
+__all__ = ['VerticalDatabase', 'ArrayDatabase', 'count_item_supports',
+           'write_vertical_database']
+
+import cPickle as pickle
+import mmap
+import struct
+import sys
+
+from array import array
+
+from .encoder import ItemEncoder
+
+MAGIC = 'RXSPVDB1'
+HEADER_FORMAT = '<8scqqqq'
+INDEX_FORMAT = '<qii'
+TYPECODE = 'i'
+
+BYTE_ORDERS = {'little': 'l', 'big': 'b'}
+
+
+def count_item_supports(events):
+    """
+    Count support of items in a stream of events (a sid is counted once per
+    run of consecutive events, thus counts are exact for events grouped by
+    sid and upper bounds otherwise).
+
+    @param events: Iterable of (sid, eid, <itemset>).
+    @type events: iterable
+    @return: Support per item {item: <support>}.
+    @rtype: dict
+    """
+    output, last_sids = {}, {}
+    for sid, _, itemset in events:
+        for item in itemset:
+            if last_sids.get(item) != sid:
+                last_sids[item] = sid
+                output[item] = output.get(item, 0) + 1
+    return output
+
+
+def write_vertical_database(filename, sequences, encoder=None):
+    """
+    Write dictionary of sequences to the file in vertical binary format.
+
+    @param filename: Output file name.
+    @type filename: str
+    @param sequences: Dictionary of sequences {sid: {eid: <itemset>}}.
+    @type sequences: dict
+    @param encoder: Encoder of items (created from sequences if None).
+    @type encoder: ItemEncoder/None
+    """
+    encoder = encoder or ItemEncoder.from_sequences(sequences)
+
+    id_lists = {}
+    for sid in sequences:
+        for e_idx, eid in enumerate(sorted(sequences[sid])):
+            for item in set(sequences[sid][eid]):
+                id_lists.\
+                    setdefault(encoder.encode_item(item), {}).\
+                    setdefault(sid, []).\
+                    append(e_idx)
+
+    sids = sorted(sequences)
+
+    with open(filename, 'wb') as fd:
+        fd.write('\0' * struct.calcsize(HEADER_FORMAT))
+        array(TYPECODE, sids).tofile(fd)
+        array(TYPECODE, [len(sequences[x]) for x in sids]).tofile(fd)
+
+        index = []
+        for code in xrange(len(encoder)):
+            item_sids = sorted(id_lists.get(code, {}))
+            positions = [id_lists[code][x] for x in item_sids]
+
+            index.append((fd.tell(), len(item_sids),
+                          sum([len(x) for x in positions])))
+            array(TYPECODE, item_sids).tofile(fd)
+            array(TYPECODE, [len(x) for x in positions]).tofile(fd)
+            for eids in positions:
+                array(TYPECODE, eids).tofile(fd)
+
+        index_offset = fd.tell()
+        for entry in index:
+            fd.write(struct.pack(INDEX_FORMAT, *entry))
+
+        dictionary_offset = fd.tell()
+        pickle.dump([encoder.decode_item(x) for x in xrange(len(encoder))],
+                    fd, pickle.HIGHEST_PROTOCOL)
+
+        fd.seek(0)
+        fd.write(struct.pack(HEADER_FORMAT, MAGIC, BYTE_ORDERS[sys.byteorder],
+                             len(sids), len(encoder), index_offset,
+                             dictionary_offset))
+
+
+class VerticalDatabase(object):
+
+    """
+    Class represents vertical binary database opened with mmap, arrays of an
+    item are read only when the item is requested.
+    """
+
+    def __init__(self, filename):
+        """
+        Initialization.
+
+        @param filename: File name.
+        @type filename: str
+        """
+        with open(filename, 'rb') as fd:
+            self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, byte_order, self._num_sequences, self._num_items,
+         self._index_offset, self._dictionary_offset) = struct.unpack_from(
+            HEADER_FORMAT, self._mmap)
+
+        if magic != MAGIC:
+            raise Exception('Unknown format of the file: %s' % filename)
+        self._byteswap = byte_order != BYTE_ORDERS[sys.byteorder]
+
+        self._sequence_sizes = None
+        self._encoder = None
+
+    def _get_array(self, offset, length):
+        """
+        Get array of integers stored at the defined offset.
+
+        @param offset: Offset in bytes.
+        @type offset: int
+        @param length: Number of integers.
+        @type length: int
+        @return: Array of integers.
+        @rtype: array.array
+        """
+        output = array(TYPECODE)
+        output.fromstring(
+            self._mmap[offset:offset + length * output.itemsize])
+        if self._byteswap:
+            output.byteswap()
+        return output
+
+    def _get_index_entry(self, code):
+        """
+        Get offset, number of sids and number of positions of the item.
+
+        @param code: Item code.
+        @type code: int
+        @return: Index entry.
+        @rtype: tuple
+        """
+        return struct.unpack_from(
+            INDEX_FORMAT, self._mmap,
+            self._index_offset + code * struct.calcsize(INDEX_FORMAT))
+
+    @property
+    def encoder(self):
+        """
+        Get encoder of items (item dictionary is loaded on the first call).
+
+        @return: ItemEncoder object.
+        @rtype: ItemEncoder
+        """
+        if self._encoder is None:
+            self._encoder = ItemEncoder(items=pickle.loads(
+                self._mmap[self._dictionary_offset:]))
+        return self._encoder
+
+    @property
+    def sequence_sizes(self):
+        """
+        Get number of itemsets per sequence.
+
+        @return: Dictionary {sid: <size>}.
+        @rtype: dict
+        """
+        if self._sequence_sizes is None:
+            offset = struct.calcsize(HEADER_FORMAT)
+            sids = self._get_array(offset, self._num_sequences)
+            sizes = self._get_array(offset + sids.itemsize * len(sids),
+                                    self._num_sequences)
+            self._sequence_sizes = dict(zip(sids, sizes))
+        return self._sequence_sizes
+
+    def get_codes(self):
+        """
+        Get codes of all items.
+
+        @return: List of item codes.
+        @rtype: list
+        """
+        return range(self._num_items)
+
+    def get_support(self, code):
+        """
+        Get support (number of distinct sids) of the item.
+
+        @param code: Item code.
+        @type code: int
+        @return: Number of distinct sids.
+        @rtype: int
+        """
+        return self._get_index_entry(code)[1]
+
+    def get_items(self, code):
+        """
+        Get (sid, eids) pairs of the item ordered by sid (eids are indexes of
+        itemsets).
+
+        @param code: Item code.
+        @type code: int
+        @return: List of pairs of sid and sorted eids.
+        @rtype: list
+        """
+        offset, num_sids, num_positions = self._get_index_entry(code)
+
+        sids = self._get_array(offset, num_sids)
+        offset += sids.itemsize * num_sids
+        counts = self._get_array(offset, num_sids)
+        offset += counts.itemsize * num_sids
+        positions = self._get_array(offset, num_positions)
+
+        output, idx = [], 0
+        for sid, count in zip(sids, counts):
+            output.append((sid, positions[idx:idx + count]))
+            idx += count
+        return output
+
+    def close(self):
+        """Close memory-mapped file."""
+        self._mmap.close()
+
+    def __len__(self):
+        return self._num_sequences
+
+
+class ArrayDatabase(object):
+
+    """
+    Class represents vertical database built in memory from columnar input
+    (parallel arrays of sids, eids and items) or from a stream of events,
+    i.e. without the dictionary of sequences.
+    """
+
+    def __init__(self, encoder=None):
+        """
+        Initialization.
+
+        @param encoder: Encoder of items.
+        @type encoder: ItemEncoder/None
+        """
+        self.encoder = encoder or ItemEncoder()
+        self.sequence_sizes = {}
+        self._items = {}
+
+    @classmethod
+    def from_columns(cls, sids, eids, items, encoder=None):
+        """
+        Create database from three parallel arrays (one entry per item
+        occurrence).
+
+        @param sids: Sequence ids.
+        @type sids: iterable
+        @param eids: Event ids.
+        @type eids: iterable
+        @param items: Items.
+        @type items: iterable
+        @param encoder: Encoder of items (codes follow the sorted order of
+            items if None).
+        @type encoder: ItemEncoder/None
+        @return: ArrayDatabase object.
+        @rtype: ArrayDatabase
+        """
+        if encoder is None:
+            items = list(items)
+            encoder = ItemEncoder(items=sorted(set(items)))
+        output = cls(encoder=encoder)
+
+        codes = array(TYPECODE, [encoder.encode_item(x) for x in items])
+        if not isinstance(sids, (list, array)):
+            sids = list(sids)
+        if not isinstance(eids, (list, array)):
+            eids = list(eids)
+        if not (len(sids) == len(eids) == len(codes)):
+            raise Exception('Arrays of sids, eids and items differ in length')
+
+        # sort-based group-by of occurrence indexes (two stable sorts give
+        # the order by sid and eid): (sid, eid) define itemset position
+        order = sorted(xrange(len(codes)), key=eids.__getitem__)
+        order.sort(key=sids.__getitem__)
+
+        sid_, eid_, position = None, None, -1
+        for idx in order:
+            sid, eid, code = sids[idx], eids[idx], codes[idx]
+
+            if sid != sid_:
+                sid_, eid_, position = sid, None, -1
+            if eid != eid_:
+                eid_, position = eid, position + 1
+                output.sequence_sizes[sid] = position + 1
+
+            pairs = output._items.setdefault(code, [])
+            if not pairs or pairs[-1][0] != sid:
+                pairs.append((sid, array(TYPECODE, [position])))
+            elif pairs[-1][1][-1] != position:
+                pairs[-1][1].append(position)
+
+        return output
+
+    @classmethod
+    def from_buffer(cls, data, encoder=None):
+        """
+        Create database from a buffer of integer triples (sid, eid, item)
+        packed as 4-byte integers in native byte order.
+
+        @param data: Object that supports buffer protocol.
+        @type data: str/bytearray/buffer/mmap
+        @param encoder: Encoder of items.
+        @type encoder: ItemEncoder/None
+        @return: ArrayDatabase object.
+        @rtype: ArrayDatabase
+        """
+        values = array(TYPECODE)
+        values.fromstring(buffer(data))
+        if len(values) % 3:
+            raise Exception('Buffer does not consist of (sid, eid, item)')
+        return cls.from_columns(sids=values[0::3], eids=values[1::3],
+                                items=values[2::3], encoder=encoder)
+
+    @classmethod
+    def from_events(cls, events, minimum_support=None, items=None,
+                    encoder=None):
+        """
+        Create database from a stream of events, events are appended to
+        per-item id-lists as they are read (events of a sequence could come
+        in any order). Positions of itemsets are counted over events with
+        kept items only.
+
+        @param events: Iterable of (sid, eid, <itemset>).
+        @type events: iterable
+        @param minimum_support: Minimum support, items with lower support
+            are dropped at the end.
+        @type minimum_support: int/None
+        @param items: Items to keep (other items are dropped while reading).
+        @type items: set/None
+        @param encoder: Encoder of items (codes follow the sorted order of
+            kept items if None).
+        @type encoder: ItemEncoder/None
+        @return: ArrayDatabase object.
+        @rtype: ArrayDatabase
+        """
+        id_lists = {}
+        for sid, eid, itemset in events:
+            for item in itemset:
+                if items is not None and item not in items:
+                    continue
+                id_lists.\
+                    setdefault(item, {}).\
+                    setdefault(sid, array(TYPECODE)).\
+                    append(eid)
+
+        for item in id_lists.keys():
+            if len(id_lists[item]) < (minimum_support or 0):
+                del id_lists[item]
+
+        output = cls(encoder=encoder or ItemEncoder(items=sorted(id_lists)))
+
+        # events are taken from kept occurrences only
+        eids_per_sid = {}
+        for eids_by_sid in id_lists.itervalues():
+            for sid, eids in eids_by_sid.iteritems():
+                eids_per_sid.setdefault(sid, set()).update(eids)
+
+        # actual eids are replaced with positions of itemsets
+        positions = {}
+        for sid, eids in eids_per_sid.iteritems():
+            eids = sorted(eids)
+            output.sequence_sizes[sid] = len(eids)
+            positions[sid] = dict([(x, idx) for idx, x in enumerate(eids)])
+        eids_per_sid.clear()
+
+        for item in id_lists.keys():
+            output._items[output.encoder.encode_item(item)] = [
+                (sid, array(TYPECODE, sorted(set(
+                    [positions[sid][x] for x in eids]))))
+                for sid, eids in sorted(id_lists.pop(item).iteritems())]
+
+        return output
+
+    def get_codes(self):
+        """
+        Get codes of all items.
+
+        @return: List of item codes.
+        @rtype: list
+        """
+        return range(len(self.encoder))
+
+    def get_support(self, code):
+        """
+        Get support (number of distinct sids) of the item.
+
+        @param code: Item code.
+        @type code: int
+        @return: Number of distinct sids.
+        @rtype: int
+        """
+        return len(self._items.get(code, ()))
+
+    def get_items(self, code):
+        """
+        Get (sid, eids) pairs of the item ordered by sid (eids are indexes of
+        itemsets).
+
+        @param code: Item code.
+        @type code: int
+        @return: List of pairs of sid and sorted eids.
+        @rtype: list
+        """
+        return self._items.get(code, [])
+
+    def close(self):
+        """Release arrays."""
+        self._items.clear()
+
+    def __len__(self):
+        return len(self.sequence_sizes)
@@ -0,0 +1,393 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+
+import random
+import unittest
+
+from pyrexplorer.spade.cmap import CoOccurrenceMap
+from pyrexplorer.spade.element import (Element, ElementDict, SequenceNode,
+                                       EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE)
+from pyrexplorer.spade.idlist import (ArrayIdList, EventSetIdList,
+                                      SupportIdList)
+from pyrexplorer.spade.index import (SequenceIndex, TopSupportElementDict,
+                                     get_signature, is_subsequence,
+                                     is_subsequence_node, is_subsequence_set)
+
+
+def nested_loop_join(element_i, element_j):
+    """
+    Reference (nested-loop) temporal join, i.e. join of every event of the
+    1st element with every event of the 2nd one.
+    """
+    output = {}
+
+    for pair_i in element_i.id_list:
+        for pair_j in element_j.id_list:
+
+            if pair_i.sid != pair_j.sid:
+                continue
+
+            if pair_i.eid == pair_j.eid:
+                if (element_i.conn_type != element_j.conn_type
+                        or element_i.key_item == element_j.key_item):
+                    continue
+                elif element_i.key_item < element_j.key_item:
+                    key_item = element_j.key_item
+                    prefix = element_i.sequence
+                else:
+                    key_item = element_i.key_item
+                    prefix = element_j.sequence
+                conn_type = EVENT_ATOM_TYPE
+                eid = pair_i.eid
+
+            else:
+                if pair_i.eid < pair_j.eid:
+                    if element_j.conn_type == EVENT_ATOM_TYPE:
+                        continue
+                    key_item = element_j.key_item
+                    prefix = element_i.sequence
+                    eid = pair_j.eid
+                else:
+                    if element_i.conn_type == EVENT_ATOM_TYPE:
+                        continue
+                    key_item = element_i.key_item
+                    prefix = element_j.sequence
+                    eid = pair_i.eid
+                conn_type = SEQUENCE_ATOM_TYPE
+
+            sequence = Element.generate_sequence(
+                last_item=key_item,
+                prefix=prefix,
+                is_sequence_atom=(conn_type == SEQUENCE_ATOM_TYPE))
+            output.setdefault(sequence, (key_item, prefix, conn_type, set()))
+            output[sequence][3].add((pair_i.sid, eid))
+
+    return output
+
+
+def generate_sequence(rnd):
+    """Random sequence of 1-4 itemsets with 1-2 items (1-4)."""
+    return tuple([tuple(sorted(rnd.sample(xrange(1, 5), rnd.randint(1, 2))))
+                  for _ in xrange(rnd.randint(1, 4))])
+
+
+class ElementJoinTest(unittest.TestCase):
+
+    """Regression tests of sort-merge join against the nested-loop join."""
+
+    def generate_element(self, rnd, item, prefix, conn_type, id_list_type):
+        element = Element(item=item, prefix=prefix, conn_type=conn_type,
+                          id_list=id_list_type())
+        for sid in rnd.sample(xrange(20), rnd.randint(0, 10)):
+            for eid in rnd.sample(xrange(8), rnd.randint(1, 4)):
+                element.update_id_list(sid=sid, eid=eid)
+        return element
+
+    def assert_join(self, element_i, element_j):
+        expected = nested_loop_join(element_i, element_j)
+        output = Element.join(element_i=element_i, element_j=element_j)
+
+        self.assertIsInstance(output, ElementDict)
+        self.assertEqual(sorted(output.get_keys()), sorted(expected))
+        for sequence, element in output.items():
+            key_item, prefix, conn_type, events = expected[sequence]
+            self.assertEqual(element.key_item, key_item)
+            self.assertEqual(element.prefix, prefix)
+            self.assertEqual(element.conn_type, conn_type)
+            self.assertEqual(element.sequence, sequence)
+            self.assertEqual(set(element.id_list), events)
+            self.assertEqual(element.support,
+                             len(set([x[0] for x in events])))
+
+    def test_join_1_sequences(self):
+        rnd = random.Random(1)
+        for id_list_type in [ArrayIdList, EventSetIdList]:
+            for _ in xrange(50):
+                item_i, item_j = rnd.randint(1, 3), rnd.randint(1, 3)
+                element_i = self.generate_element(
+                    rnd, item_i, None, None, id_list_type)
+                element_j = self.generate_element(
+                    rnd, item_j, None, None, id_list_type)
+                self.assert_join(element_i, element_i)
+                self.assert_join(element_i, element_j)
+
+    def test_join_class_members(self):
+        rnd = random.Random(2)
+        prefix = ((1,), (2,))
+        for id_list_type in [ArrayIdList, EventSetIdList]:
+            for _ in xrange(100):
+                elements = [
+                    self.generate_element(
+                        rnd, rnd.randint(3, 5), prefix,
+                        rnd.choice([EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE]),
+                        id_list_type)
+                    for _ in xrange(2)]
+                self.assert_join(elements[0], elements[0])
+                self.assert_join(elements[0], elements[1])
+                self.assert_join(elements[1], elements[0])
+
+
+class IdListTest(unittest.TestCase):
+
+    """Tests of id-list representations against sets of events."""
+
+    def generate_events(self, rnd):
+        return set([(rnd.randrange(10), rnd.randrange(8))
+                    for _ in xrange(rnd.randint(0, 30))])
+
+    def get_id_list(self, rnd, id_list_type, events):
+        events = list(events)
+        rnd.shuffle(events)
+
+        output = id_list_type()
+        for sid, eid in events:
+            output.add(sid, eid)
+            # duplicated events are ignored
+            output.add(sid, eid)
+        return output
+
+    def test_columnar_id_list(self):
+        rnd = random.Random(4)
+        for _ in xrange(200):
+            events_i = self.generate_events(rnd)
+            events_j = self.generate_events(rnd)
+            for id_list_type in [ArrayIdList, EventSetIdList]:
+                id_list_i = self.get_id_list(rnd, id_list_type, events_i)
+                id_list_j = self.get_id_list(rnd, id_list_type, events_j)
+
+                self.assertEqual(list(id_list_i), sorted(events_i))
+                self.assertEqual(len(id_list_i), len(events_i))
+                self.assertEqual(id_list_i.support,
+                                 len(set([x[0] for x in events_i])))
+                self.assertEqual(
+                    [(x, list(y)) for x, y in id_list_i.items()],
+                    [(x, sorted([y[1] for y in events_i if y[0] == x]))
+                     for x in sorted(set([y[0] for y in events_i]))])
+
+                self.assertEqual(list(id_list_i.equal_join(id_list_j)),
+                                 sorted(events_i & events_j))
+                self.assertEqual(
+                    list(id_list_i.temporal_join(id_list_j)),
+                    sorted([x for x in events_j if [
+                        y for y in events_i if y[0] == x[0] and y[1] < x[1]]]))
+                self.assertEqual(list(id_list_i.difference(id_list_j)),
+                                 sorted(events_i - events_j))
+                self.assertEqual(list(id_list_i.union([id_list_j])),
+                                 sorted(events_i | events_j))
+
+
+class ElementTest(unittest.TestCase):
+
+    """Tests of cached properties of Element against its sequence."""
+
+    def test_cached_properties(self):
+        rnd = random.Random(14)
+        for _ in xrange(200):
+            sequence = generate_sequence(rnd)
+            prefix = sequence[:-1]
+            if len(sequence[-1]) > 1:
+                prefix += (sequence[-1][:-1],)
+            element = Element(
+                item=sequence[-1][-1], prefix=prefix or None,
+                conn_type=(EVENT_ATOM_TYPE if len(sequence[-1]) > 1
+                           else SEQUENCE_ATOM_TYPE if prefix else None))
+
+            self.assertFalse(hasattr(element, '__dict__'))
+            self.assertEqual(element.sequence, sequence)
+            self.assertEqual(element.prefix, prefix or None)
+            self.assertEqual(element.sequence_length,
+                             sum(map(len, sequence)))
+            self.assertEqual(element.sequence_size, len(sequence))
+
+            events = set()
+            for _ in xrange(rnd.randint(1, 10)):
+                event = (rnd.randrange(5), rnd.randrange(5))
+                element.update_id_list(*event)
+                events.add(event)
+                # cached support is reset by new events
+                self.assertEqual(element.support,
+                                 len(set([x[0] for x in events])))
+
+            copy = element.copy(
+                id_list=SupportIdList.from_id_list(element.id_list))
+            self.assertIs(copy.node, element.node)
+            self.assertEqual(copy.support, element.support)
+
+            element.id_list = ArrayIdList()
+            self.assertEqual(element.support, 0)
+            self.assertEqual(copy.support, len(set([x[0] for x in events])))
+
+
+class SequenceNodeTest(unittest.TestCase):
+
+    """Tests of sequences kept as nodes of the prefix trie."""
+
+    def test_interned_nodes(self):
+        root = SequenceNode()
+        element_i = Element(item=1, prefix=root, sid=1, eid=1)
+        element_j = Element(item=2, prefix=root, sid=1, eid=2)
+        self.assertIs(element_i.node, root.get_child(1, None))
+
+        joined = Element.join_elements(element_i, element_j)
+        self.assertEqual([x.sequence for x in joined], [((1,), (2,))])
+        self.assertIs(joined[0].node,
+                      element_i.node.get_child(2, SEQUENCE_ATOM_TYPE))
+        self.assertIs(joined[0].node.parent, element_i.node)
+        self.assertEqual(joined[0].prefix, ((1,),))
+
+    def test_subsequence_walk(self):
+        rnd = random.Random(3)
+        for _ in xrange(500):
+            sequence_i = generate_sequence(rnd)
+            sequence_j = generate_sequence(rnd)
+            node_i = SequenceNode.from_sequence(sequence_i)
+            node_j = SequenceNode.from_sequence(sequence_j)
+            self.assertEqual(node_i.sequence, sequence_i)
+            self.assertEqual(node_i.length, sum(map(len, sequence_i)))
+            self.assertEqual(node_i.size, len(sequence_i))
+            self.assertEqual(is_subsequence_node(node_i, node_j),
+                             is_subsequence(sequence_i, sequence_j, level=1))
+            self.assertEqual(cmp(node_i.compare(node_j), 0),
+                             cmp(sequence_i, sequence_j))
+            self.assertEqual(node_i < node_j, sequence_i < sequence_j)
+
+    def test_cmap_pruning(self):
+        prefix = SequenceNode().get_child(0, None)
+        element_i = Element(item=1, prefix=prefix, conn_type=EVENT_ATOM_TYPE,
+                            sid=1, eid=1)
+        element_j = Element(item=2, prefix=prefix, conn_type=EVENT_ATOM_TYPE,
+                            sid=1, eid=1)
+
+        cmap = CoOccurrenceMap()
+        cmap.add(1, SEQUENCE_ATOM_TYPE, 2)
+        self.assertEqual(cmap.get_row(1, SEQUENCE_ATOM_TYPE), 1 << 2)
+        self.assertFalse(cmap.has(1, EVENT_ATOM_TYPE, 2))
+        self.assertEqual(
+            Element.join_elements(element_i, element_j, cmap=cmap), [])
+
+        cmap.add(1, EVENT_ATOM_TYPE, 2)
+        self.assertEqual(
+            [x.sequence for x in Element.join_elements(
+                element_i, element_j, cmap=cmap)], [((0, 1, 2),)])
+
+
+class SequenceIndexTest(unittest.TestCase):
+
+    """Tests of the inverted index against the linear scan of sequences."""
+
+    def test_lookups(self):
+        rnd = random.Random(12)
+        index, sequences = SequenceIndex(), set()
+        for _ in xrange(300):
+            sequence = generate_sequence(rnd)
+            if sequence in sequences and rnd.random() < 0.5:
+                index.remove(key=sequence)
+                sequences.discard(sequence)
+            else:
+                index.add(key=sequence, sequence=sequence)
+                sequences.add(sequence)
+            self.assertEqual(len(index), len(sequences))
+
+            sequence = generate_sequence(rnd)
+            self.assertEqual(
+                sorted(index.get_supersequences(sequence)),
+                sorted([x for x in sequences
+                        if is_subsequence(sequence, x, level=1)]))
+            self.assertEqual(
+                sorted(index.get_subsequences(
+                    SequenceNode.from_sequence(sequence))),
+                sorted([x for x in sequences
+                        if is_subsequence(x, sequence, level=1)]))
+
+
+class SignatureTest(unittest.TestCase):
+
+    """Tests of signature pruning against sub-sequence checks per sid."""
+
+    def generate_sequences(self, rnd):
+        # prefix item and items of atoms (sequence atoms are negative)
+        return dict([
+            (sid, tuple([rnd.randrange(1, 100)] + [
+                rnd.choice([-1, 1]) * rnd.randrange(1, 100)
+                for _ in xrange(rnd.randint(0, 6))]))
+            for sid in rnd.sample(xrange(8), rnd.randint(1, 6))])
+
+    def test_is_subsequence_set(self):
+        rnd = random.Random(15)
+        sid_bits, counter = {}, 0
+        for _ in xrange(2000):
+            sequences_j = self.generate_sequences(rnd)
+            if rnd.random() < 0.5:
+                # sub-sequences of some sids (with dropped items)
+                sequences_i = dict([
+                    (sid, tuple([x for idx, x in enumerate(sequence)
+                                 if not idx or rnd.random() < 0.7]))
+                    for sid, sequence in sequences_j.iteritems()
+                    if rnd.random() < 0.8])
+                if not sequences_i:
+                    continue
+            else:
+                sequences_i = self.generate_sequences(rnd)
+
+            expected = all([sid in sequences_j
+                            and is_subsequence(x, sequences_j[sid])
+                            for sid, x in sequences_i.iteritems()])
+            counter += expected
+            self.assertEqual(
+                is_subsequence_set(
+                    sequences_i=sequences_i,
+                    sequences_j=sequences_j,
+                    signature_i=get_signature(sequences_i, sid_bits),
+                    signature_j=get_signature(sequences_j, sid_bits)),
+                expected)
+        self.assertTrue(counter)
+
+
+class TopSupportElementDictTest(unittest.TestCase):
+
+    """Tests of elements with top supports against the full dictionary."""
+
+    def test_updates(self):
+        rnd = random.Random(11)
+        root = SequenceNode()
+        elementdict, supports = TopSupportElementDict(top_number=5), {}
+        for _ in xrange(3000):
+            item = rnd.randrange(40)
+            if rnd.random() < 0.3:
+                elementdict.remove(key=item)
+                supports.pop(item, None)
+                continue
+
+            support = rnd.randint(1, 30)
+            elementdict.set(key=item, element=Element(
+                item=item, prefix=root,
+                id_list=SupportIdList(support=support, size=support)))
+            supports[item] = support
+            # the lowest supports are dropped while enough others are left
+            while supports:
+                minimum_support = min(supports.values())
+                if len([x for x in supports.values()
+                        if x > minimum_support]) < 5:
+                    break
+                supports = dict([(x, y) for x, y in supports.items()
+                                 if y > minimum_support])
+
+            self.assertEqual(dict([(x, y.support)
+                                   for x, y in elementdict.items()]),
+                             supports)
+            self.assertEqual(elementdict.get_threshold(),
+                             min(supports.values())
+                             if len(supports) >= 5 else None)
+            self.assertLessEqual(len(elementdict._heap),
+                                 2 * len(elementdict) + 64 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,761 @@
+#
+# Copyright 2015 Mikhail Titov
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+
+import gc
+import gzip
+import imp
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from array import array
+from contextlib import closing
+
+from pyrexplorer.spade import (SPADEm, MiningSession, ItemEncoder,
+                               BITMAP_ENGINE, DFS_STRATEGY, BFS_STRATEGY,
+                               AUTO_STRATEGY)
+from pyrexplorer.spade import spade
+from pyrexplorer.spade.element import (Pattern, EVENT_ATOM_TYPE,
+                                       SEQUENCE_ATOM_TYPE)
+from pyrexplorer.spade.idlist import ArrayIdList, EventSetIdList
+from pyrexplorer.spade.index import is_subsequence
+from pyrexplorer.spade.vertical import (VerticalDatabase, ArrayDatabase,
+                                        write_vertical_database)
+
+
+class CountedIdList(ArrayIdList):
+
+    """Columnar id-list which objects are counted by gc (probe)."""
+
+    __slots__ = ()
+
+    @classmethod
+    def get_live_id_lists(cls):
+        return [x for x in gc.get_objects() if isinstance(x, cls)]
+
+    @classmethod
+    def get_live_number(cls):
+        return len(cls.get_live_id_lists())
+
+
+class ProbeSPADEm(SPADEm):
+
+    """
+    Miner that samples the number (and bytes) of live id-lists after every
+    class.
+    """
+
+    def __init__(self):
+        super(ProbeSPADEm, self).__init__()
+        self.peak_id_lists = 0
+        self.peak_nbytes = 0
+
+    def add_frequent_sequences(self, *args, **kwargs):
+        id_lists = CountedIdList.get_live_id_lists()
+        self.peak_id_lists = max(self.peak_id_lists, len(id_lists))
+        self.peak_nbytes = max(self.peak_nbytes,
+                               sum([x.nbytes for x in id_lists]))
+        super(ProbeSPADEm, self).add_frequent_sequences(*args, **kwargs)
+
+
+def generate_deep_sequences(number, length, noise, seed=1):
+    """
+    Sequences with common pattern of the defined length (deep search) and
+    random noise item per event.
+    """
+    generator = random.Random(seed)
+
+    output = {}
+    for sid in xrange(number):
+        output[sid] = dict([(eid, (eid, length + generator.randrange(noise)))
+                            for eid in xrange(length)])
+    return output
+
+
+class SPADEmMemoryTest(unittest.TestCase):
+
+    """Tests of id-lists that are kept during the search."""
+
+    def test_bounded_peak_memory(self):
+        for length in [8, 12, 16]:
+            spadem = ProbeSPADEm()
+            spadem.set(sequences=generate_deep_sequences(
+                number=30, length=length, noise=4 * length),
+                minimum_support=15, id_list_type=CountedIdList)
+            patterns = spadem.execute(records=True)
+
+            self.assertEqual(max([x.sequence_length for x in patterns]),
+                             length)
+            self.assertTrue(all([isinstance(x, Pattern) for x in patterns]))
+
+            # id-lists of parents are released once their class is searched
+            # (live id-lists grow with depth only, not with explored nodes)
+            self.assertLessEqual(spadem.peak_id_lists, length + 2)
+
+            # found sequences keep only support (and occurrences)
+            self.assertEqual(CountedIdList.get_live_number(), 0)
+
+    def test_diffsets(self):
+        generator = random.Random(1)
+        sequences = dict([
+            (sid, dict([(eid, tuple([x for x in xrange(6)
+                                     if generator.random() > 0.1]))
+                        for eid in xrange(3)]))
+            for sid in xrange(300)])
+
+        output = []
+        for diffset_density in [None, 0.5]:
+            spadem = ProbeSPADEm()
+            spadem.set(sequences=sequences, minimum_support=120,
+                       id_list_type=CountedIdList)
+            patterns = spadem.execute(max_length=3, records=True,
+                                      diffset_density=diffset_density)
+            output.append((set([(x.sequence, x.support) for x in patterns]),
+                           spadem.peak_nbytes))
+
+        self.assertEqual(output[1][0], output[0][0])
+        # id-lists of dense classes share the union (diffsets are not
+        # chained through id-lists of parents)
+        self.assertLess(output[1][1], output[0][1])
+
+
+class SPADEmIncrementalTest(unittest.TestCase):
+
+    """Tests of incremental mining against full re-mining."""
+
+    def test_append_new_items(self):
+        generator = random.Random(5)
+        sequences = dict([
+            (sid, dict([(eid, tuple(generator.sample(
+                xrange(3, 8) if sid < 20 else xrange(9),
+                generator.randint(1, 3))))
+                for eid in xrange(generator.randint(1, 5))]))
+            for sid in xrange(32)])
+
+        spadem = SPADEm()
+        spadem.set(sequences=dict([(x, sequences[x]) for x in xrange(20)]),
+                   minimum_support=4)
+        spadem.execute(incremental=True)
+        # items 0-2 and 8 are new (codes of items 3-7 are shifted)
+        elements = spadem.append(dict([(x, sequences[x])
+                                       for x in xrange(20, 32)]))
+
+        spadem_ = SPADEm()
+        spadem_.set(sequences=sequences, minimum_support=4)
+        self.assertEqual(
+            sorted([(x.sequence, x.support) for x in elements]),
+            sorted([(x.sequence, x.support) for x in spadem_.execute()]))
+        self.assertTrue([x for x in elements if x.sequence[0][0] < 3])
+
+
+class SPADEmEncoderTest(unittest.TestCase):
+
+    """Tests of mining on codes of items."""
+
+    def test_frequency_order(self):
+        generator = random.Random(6)
+        sequences = dict([
+            (sid, dict([(eid, tuple(generator.sample(
+                ['i%s' % x for x in xrange(6)], generator.randint(1, 3))))
+                for eid in xrange(generator.randint(1, 5))]))
+            for sid in xrange(20)])
+
+        encoder = ItemEncoder.from_sequences(sequences, frequency_order=True)
+        supports = [len([x for x in sequences.itervalues()
+                         if [y for y in x.itervalues() if item in y]])
+                    for item in encoder.get_items()]
+        self.assertEqual(supports, sorted(supports, reverse=True))
+        self.assertNotEqual(encoder.get_items(),
+                            sorted(encoder.get_items()))
+        self.assertEqual(encoder.decode_sequences(
+            encoder.encode_sequences(sequences)), sequences)
+
+        output = []
+        for encoder_ in [None, encoder]:
+            spadem = SPADEm()
+            spadem.set(sequences=sequences, minimum_support=4,
+                       encoder=encoder_)
+
+            # itemsets are sorted by items (the key item is the last one)
+            for element in spadem.execute():
+                self.assertEqual(element.sequence, tuple(
+                    [tuple(sorted(x)) for x in element.sequence]))
+                self.assertEqual(element.key_item, element.sequence[-1][-1])
+
+            output.append((
+                set([(x.sequence, x.support)
+                     for x in spadem.execute(closed=True)]),
+                set([(x.sequence, x.support)
+                     for x in spadem.execute_top_support(top_k=10 ** 6)])))
+
+        # closed and all frequent sequences do not depend on order of codes
+        self.assertEqual(output[1], output[0])
+
+
+def has_occurrence(sequence, itemsets, min_gap=None, max_gap=None,
+                   max_window=None, idx=0, prev_eid=None, start_eid=None):
+    """
+    Reference (backtracking) check of the constrained occurrence of the
+    sequence in itemsets [(eid, <set of items>)].
+    """
+    if idx == len(sequence):
+        return True
+
+    for eid, itemset in itemsets:
+        if prev_eid is not None and (
+                eid - prev_eid < max(min_gap or 1, 1)
+                or (max_gap is not None and eid - prev_eid > max_gap)):
+            continue
+        start = eid if start_eid is None else start_eid
+        if max_window is not None and eid - start > max_window:
+            continue
+        if (set(sequence[idx]) <= itemset
+                and has_occurrence(sequence, itemsets, min_gap, max_gap,
+                                   max_window, idx + 1, eid, start)):
+            return True
+    return False
+
+
+def mine_frequent_sequences(sequences, minimum_support, **constraints):
+    """
+    Reference (pattern growth) miner of frequent sequences, every prefix of
+    a frequent sequence is frequent with time constraints too.
+    """
+    itemsets = [[(y, set(x[y])) for y in sorted(x)]
+                for x in sequences.itervalues()]
+    items = sorted(set([i for x in itemsets for _, y in x for i in y]))
+
+    output, pending = {}, [()]
+    while pending:
+        sequence = pending.pop()
+        for item in items:
+            candidates = [sequence + ((item,),)]
+            if sequence and item > sequence[-1][-1]:
+                candidates.append(sequence[:-1] + (sequence[-1] + (item,),))
+            for candidate in candidates:
+                support = len([x for x in itemsets
+                               if has_occurrence(candidate, x, **constraints)])
+                if support >= minimum_support:
+                    output[candidate] = support
+                    pending.append(candidate)
+    return output
+
+
+def select_sequences(frequent, closed=False):
+    """Maximal (or closed) sequences among frequent ones."""
+    return dict([
+        (x, support) for x, support in frequent.iteritems()
+        if not [y for y in frequent
+                if y != x and (not closed or frequent[y] == support)
+                and is_subsequence(x, y, level=1)]])
+
+
+class SPADEmConstraintsTest(unittest.TestCase):
+
+    """Tests of time constraints that are applied by joins of id-lists."""
+
+    def test_constrained_support(self):
+        generator = random.Random(2)
+        sequences = {}
+        for sid in xrange(20):
+            eid, sequences[sid] = 0, {}
+            for _ in xrange(generator.randint(1, 6)):
+                eid += generator.randint(1, 4)
+                sequences[sid][eid] = tuple(generator.sample(xrange(5), 2))
+
+        for constraints in [{'max_gap': 3}, {'min_gap': 2},
+                            {'max_window': 5},
+                            {'min_gap': 1, 'max_gap': 4, 'max_window': 8}]:
+            spadem = SPADEm()
+            spadem.set(sequences=sequences, minimum_support=4)
+            elements = spadem.execute(**constraints)
+
+            self.assertTrue(elements)
+            for element in elements:
+                support = len([
+                    x for x in sequences.itervalues()
+                    if has_occurrence(element.sequence,
+                                      [(y, set(x[y])) for y in sorted(x)],
+                                      **constraints)])
+                self.assertEqual(element.support, support)
+                self.assertGreaterEqual(support, 4)
+
+    def test_complete_output(self):
+        spadem = SPADEm()
+        spadem.set(sequences=dict([(sid, {1: (1,), 3: (3,), 5: (4,)})
+                                   for sid in xrange(2)]),
+                   minimum_support=2)
+        # the sub-sequence (1)(4) is not frequent with the maximum gap
+        self.assertEqual([(x.sequence, x.support)
+                          for x in spadem.execute(max_gap=2)],
+                         [(((1,), (3,), (4,)), 2)])
+
+        generator = random.Random(4)
+        sequences = {}
+        for sid in xrange(12):
+            eid, sequences[sid] = 0, {}
+            for _ in xrange(generator.randint(1, 6)):
+                eid += generator.randint(1, 4)
+                sequences[sid][eid] = tuple(sorted(
+                    generator.sample(xrange(5), generator.randint(1, 2))))
+
+        for constraints in [{'max_gap': 2}, {'max_gap': 3},
+                            {'min_gap': 2, 'max_gap': 4}, {'min_gap': 2},
+                            {'max_gap': 3, 'max_window': 6},
+                            {'max_window': 5}]:
+            frequent = mine_frequent_sequences(sequences, 2, **constraints)
+            spadem = SPADEm()
+            spadem.set(sequences=sequences, minimum_support=2)
+
+            elements = spadem.execute(closed=True, **constraints)
+            self.assertEqual(dict([(x.sequence, x.support)
+                                   for x in elements]),
+                             select_sequences(frequent, closed=True))
+
+            if 'max_gap' in constraints:
+                elements = spadem.execute(**constraints)
+                self.assertEqual(dict([(x.sequence, x.support)
+                                       for x in elements]),
+                                 select_sequences(frequent))
+
+        # sequence atoms are not sub-sets of the parent's id-list
+        self.assertRaises(Exception, spadem.execute, max_gap=3,
+                          diffset_density=0.1)
+
+
+class SPADEmClosedTest(unittest.TestCase):
+
+    """Tests of closed sequences against all frequent sequences."""
+
+    def test_closed_sequences(self):
+        generator = random.Random(3)
+        sequences = dict([
+            (sid, dict([(eid, tuple(generator.sample(xrange(5), 2)))
+                        for eid in xrange(generator.randint(1, 6))]))
+            for sid in xrange(25)])
+
+        spadem = SPADEm()
+        spadem.set(sequences=sequences, minimum_support=4)
+        patterns = spadem.execute_top_support(top_k=10 ** 6)
+        expected = set([
+            (x.sequence, x.support) for x in patterns
+            if not [y for y in patterns
+                    if y.support == x.support and y.sequence != x.sequence
+                    and is_subsequence(x.sequence, y.sequence, level=1)]])
+
+        for options in [{}, {'records': True}, {'diffset_density': 0.2}]:
+            elements = spadem.execute(closed=True, **options)
+            self.assertEqual(set([(x.sequence, x.support) for x in elements]),
+                             expected)
+            self.assertLess(len(elements), len(patterns))
+
+
+class SPADEmTopSupportTest(unittest.TestCase):
+
+    """Tests of top-k frequent sequences against all frequent sequences."""
+
+    def test_top_support(self):
+        generator = random.Random(10)
+        sequences = dict([
+            (sid, dict([(eid, tuple(sorted(generator.sample(
+                xrange(5), generator.randint(1, 2)))))
+                for eid in xrange(generator.randint(1, 5))]))
+            for sid in xrange(20)])
+        frequent = mine_frequent_sequences(sequences, 2)
+        supports = sorted(frequent.values(), reverse=True)
+
+        spadem = SPADEm()
+        spadem.set(sequences=sequences, minimum_support=2)
+        for top_k in [1, 3, 10, 50, len(frequent), len(frequent) + 1]:
+            # sequences with the same support as the last top one are kept
+            threshold = supports[min(top_k, len(supports)) - 1]
+            expected = dict([(x, support) for x, support in frequent.items()
+                             if support >= threshold])
+            for strategy in [DFS_STRATEGY, BFS_STRATEGY]:
+                patterns = spadem.execute_top_support(top_k=top_k,
+                                                      strategy=strategy)
+                self.assertEqual(dict([(x.sequence, x.support)
+                                       for x in patterns]), expected)
+                self.assertEqual(len(patterns), len(expected))
+
+
+class SPADEmCountingTest(unittest.TestCase):
+
+    """Tests of frequent 2-sequences against the reference counts."""
+
+    def count_2_sequences(self, sequences, minimum_support):
+        # sids with occurrences of every 2-sequence
+        sids = {}
+        for sid, itemsets in sequences.iteritems():
+            eids = sorted(itemsets)
+            for idx, eid in enumerate(eids):
+                for item_i in itemsets[eid]:
+                    for item_j in itemsets[eid]:
+                        if item_i < item_j:
+                            sids.setdefault(((item_i, item_j),),
+                                            set()).add(sid)
+                    for eid_j in eids[idx + 1:]:
+                        for item_j in itemsets[eid_j]:
+                            sids.setdefault(((item_i,), (item_j,)),
+                                            set()).add(sid)
+        return dict([(x, len(y)) for x, y in sids.iteritems()
+                     if len(y) >= minimum_support])
+
+    def test_2_sequences(self):
+        generator = random.Random(13)
+        # items are repeated within sequences (sids are counted once)
+        sequences = dict([
+            (sid, dict([(eid, tuple(sorted(generator.sample(
+                xrange(4), generator.randint(1, 3)))))
+                for eid in xrange(generator.randint(1, 8))]))
+            for sid in xrange(30)])
+        expected = self.count_2_sequences(sequences, 5)
+        self.assertTrue(expected)
+
+        for engine in [None, BITMAP_ENGINE]:
+            spadem = SPADEm()
+            spadem.set(sequences=sequences, minimum_support=5)
+            _, freq_2s_elementdict = spadem.generate_frequent_sequences(
+                engine=engine)
+            elements = freq_2s_elementdict.get_elements()
+            self.assertEqual(dict([(spadem.decode(x).sequence, x.support)
+                                   for x in elements]), expected)
+
+            # cmap keeps connections of frequent 2-sequences only
+            self.assertEqual(
+                set([(x.prefix[0][0], x.conn_type, x.key_item)
+                     for x in elements]),
+                set([(x, y, z) for x in xrange(4)
+                     for y in [EVENT_ATOM_TYPE, SEQUENCE_ATOM_TYPE]
+                     for z in xrange(4) if spadem._cmap.has(x, y, z)]))
+
+
+class SPADEmOptionsTest(unittest.TestCase):
+
+    """Tests of options of SPADEm against the default path."""
+
+    def setUp(self):
+        generator = random.Random(12)
+        self.sequences = dict([
+            (sid, dict([(eid, tuple(sorted(generator.sample(
+                xrange(6), generator.randint(1, 3)))))
+                for eid in xrange(generator.randint(1, 6))]))
+            for sid in xrange(40)])
+
+    def get_outputs(self, spadem=None, **options):
+        if spadem is None:
+            spadem = SPADEm()
+            spadem.set(sequences=self.sequences, minimum_support=4)
+        return [sorted([(x.sequence, x.support)
+                        for x in spadem.execute(**dict(options, **x))])
+                for x in [{}, {'max_length': 3}, {'top_number': 5},
+                          {'closed': True}]]
+
+    def test_bitmap_engine(self):
+        self.assertEqual(self.get_outputs(engine=BITMAP_ENGINE),
+                         self.get_outputs())
+
+        spadem = SPADEm()
+        spadem.set(sequences=self.sequences, minimum_support=4)
+        self.assertEqual(
+            spadem.execute_top_support(top_k=20, engine=BITMAP_ENGINE),
+            spadem.execute_top_support(top_k=20))
+
+    def test_vertical_database(self):
+        handle, filename = tempfile.mkstemp(suffix='.vdb')
+        os.close(handle)
+        try:
+            write_vertical_database(filename, self.sequences)
+            database = VerticalDatabase(filename)
+            try:
+                spadem = SPADEm()
+                spadem.set(database=database, minimum_support=4)
+                self.assertEqual(self.get_outputs(spadem=spadem),
+                                 self.get_outputs())
+            finally:
+                database.close()
+        finally:
+            os.remove(filename)
+
+    def test_columns(self):
+        events = [(sid, eid, item) for sid in sorted(self.sequences)
+                  for eid in sorted(self.sequences[sid])
+                  for item in self.sequences[sid][eid]]
+        random.Random(14).shuffle(events)
+
+        for columns in [
+                tuple([array('i', x) for x in zip(*events)]),
+                array('i', [x for event in events for x in event]).tostring()]:
+            spadem = SPADEm()
+            spadem.set(columns=columns, minimum_support=4)
+            self.assertEqual(self.get_outputs(spadem=spadem),
+                             self.get_outputs())
+
+        # duplicated occurrences are counted once
+        columns = tuple([array('i', x) for x in zip(*(events + events))])
+        spadem = SPADEm()
+        spadem.set(columns=columns, minimum_support=4)
+        self.assertEqual(self.get_outputs(spadem=spadem), self.get_outputs())
+
+        spadem = SPADEm()
+        self.assertRaises(Exception, spadem.set,
+                          columns=(columns[0], columns[1][1:], columns[2]))
+
+    def test_events(self):
+        database = ArrayDatabase.from_events(
+            events=[(1, 3, 'ab'), (1, 5, 'c'), (1, 9, 'a'), (2, 2, 'a'),
+                    (3, 4, 'd')],
+            minimum_support=2)
+        # events of dropped items are not counted
+        self.assertEqual(database.sequence_sizes, {1: 2, 2: 1})
+        self.assertEqual(
+            [(sid, list(eids)) for sid, eids in database.get_items(
+                database.encoder.encode_item('a'))],
+            [(1, [0, 1]), (2, [0])])
+
+    def test_streamed_csv(self):
+        rxspade = imp.load_source('rxspade', os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'bin',
+            'rxspade'))
+        lines = ['%s,%s,%s\n' % (sid, eid, ','.join(map(str, itemset)))
+                 for sid in sorted(self.sequences)
+                 for eid, itemset in sorted(self.sequences[sid].items())]
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'sequences.csv')
+            with open(filename, 'w') as fd:
+                fd.writelines(lines)
+            spadem = SPADEm()
+            spadem.set(sequences=rxspade.read_csv(filename),
+                       minimum_support=4)
+            expected = self.get_outputs(spadem=spadem)
+
+            with closing(gzip.open(filename + '.gz', 'wb')) as fd:
+                fd.writelines(lines)
+            for name in [filename, filename + '.gz']:
+                for minimum_support in [None, 4]:
+                    spadem = SPADEm()
+                    spadem.set(database=rxspade.read_database(
+                        name, minimum_support=minimum_support),
+                        minimum_support=4)
+                    self.assertEqual(self.get_outputs(spadem=spadem),
+                                     expected)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_id_list_types(self):
+        spadem = SPADEm()
+        spadem.set(sequences=self.sequences, minimum_support=4,
+                   id_list_type=EventSetIdList)
+        self.assertEqual(self.get_outputs(spadem=spadem), self.get_outputs())
+
+    def test_iter_execute(self):
+        spadem = SPADEm()
+        spadem.set(sequences=self.sequences, minimum_support=4)
+        for options in [{}, {'max_length': 3}, {'top_number': 5},
+                        {'records': True}, {'workers': 2}]:
+            output = [(x.sequence, x.support)
+                      for x in spadem.iter_execute(**options)]
+            # every sequence is yielded once
+            self.assertEqual(len(output), len(set(output)))
+            self.assertEqual(sorted(output), sorted([
+                (x.sequence, x.support)
+                for x in spadem.execute(**options)]))
+
+    def test_top_number(self):
+        spadem = SPADEm()
+        spadem.set(sequences=self.sequences, minimum_support=4)
+        # maximal sequences are ranked by length, number of itemsets and
+        # sequence itself
+        ranked = sorted([(x.sequence_length, x.sequence_size, x.sequence,
+                          x.support) for x in spadem.execute()])
+        for top_number in xrange(1, len(ranked) + 2):
+            for options in [{}, {'records': True}]:
+                elements = spadem.execute(top_number=top_number, **options)
+                self.assertLessEqual(len(elements), top_number)
+                self.assertEqual(
+                    sorted([(x.sequence, x.support) for x in elements]),
+                    sorted([x[2:] for x in ranked[-top_number:]]))
+
+    def test_random_top_number(self):
+        for seed in xrange(30):
+            generator = random.Random(seed)
+            items = generator.randint(2, 6)
+            sequences = dict([
+                (sid, dict([(eid, tuple(sorted(generator.sample(
+                    xrange(items), generator.randint(1, min(3, items))))))
+                    for eid in xrange(generator.randint(1, 6))]))
+                for sid in xrange(generator.randint(5, 25))])
+
+            spadem = SPADEm()
+            spadem.set(sequences=sequences,
+                       minimum_support=generator.randint(2, 4))
+            # found sequences could be replaced by longer ones later, thus
+            # only final ones define which sequences are dropped
+            ranked = sorted([(x.sequence_length, x.sequence_size, x.sequence,
+                              x.support) for x in spadem.execute()])
+            for top_number in xrange(1, len(ranked) + 2):
+                self.assertEqual(
+                    sorted([(x.sequence, x.support) for x in spadem.execute(
+                        top_number=top_number)]),
+                    sorted([x[2:] for x in ranked[-top_number:]]))
+
+    def test_max_memory(self):
+        # every id-list of pending classes is spilled
+        self.assertEqual(self.get_outputs(max_memory=1), self.get_outputs())
+        self.assertEqual(self.get_outputs(max_memory=1, records=True),
+                         self.get_outputs())
+
+    def test_signatures(self):
+        expected = self.get_outputs()
+
+        # signatures keep bitmaps of sids only (hashed items and lengths
+        # never reject a pair of sequences)
+        get_signature = spade.get_signature
+        spade.get_signature = lambda sequences, sid_bits: (
+            get_signature(sequences, sid_bits)[:1]
+            + (0, 0, dict.fromkeys(sequences, 0)))
+        try:
+            self.assertEqual(self.get_outputs(), expected)
+        finally:
+            spade.get_signature = get_signature
+
+    def test_workers(self):
+        self.assertEqual(self.get_outputs(workers=2), self.get_outputs())
+
+
+class MiningSessionTest(unittest.TestCase):
+
+    """Tests of the lattice of the mining session against re-mining."""
+
+    def generate_sequences(self, seed):
+        generator = random.Random(seed)
+        return dict([
+            (sid, dict([(eid, tuple(generator.sample(xrange(6), 2)))
+                        for eid in xrange(generator.randint(1, 5))]))
+            for sid in xrange(30)])
+
+    def get_output(self, session, **kwargs):
+        return sorted([(x.sequence, x.support)
+                       for x in session.query(**kwargs)])
+
+    def test_extend_lattice(self):
+        sequences = self.generate_sequences(seed=7)
+
+        session = MiningSession()
+        session.set(sequences=sequences)
+        session.query(minimum_support=3, max_length=3)
+        self.assertTrue(session.extend_lattice(max_length=5))
+
+        session_ = MiningSession()
+        session_.set(sequences=sequences)
+        self.assertEqual(
+            self.get_output(session, minimum_support=3, max_length=5),
+            self.get_output(session_, minimum_support=3, max_length=5))
+
+    def test_cache_eviction(self):
+        sequences = self.generate_sequences(seed=8)
+
+        session_ = MiningSession(max_memory=None)
+        session_.set(sequences=sequences)
+        expected = self.get_output(session_, minimum_support=3, max_length=5)
+
+        for kwargs in [{'cache_size': 5}, {'max_memory': 1024},
+                       {'cache_size': 0}]:
+            session = MiningSession(**kwargs)
+            session.set(sequences=sequences)
+            session.query(minimum_support=3, max_length=4)
+            patterns = [x for x in session._lattice.get_elements()
+                        if x.sequence_length == 4]
+            self.assertTrue(patterns)
+
+            cached = [x for x in patterns if session.get_id_list(
+                session.decode(x).sequence) is not None]
+            self.assertLess(len(cached), len(patterns))
+            self.assertLessEqual(len(cached), kwargs.get('cache_size', 5))
+            self.assertLessEqual(session._deep_nbytes, session._cache_memory)
+            self.assertEqual(session._deep_nbytes, sum(
+                [x[1] for x in session._deep_elements.values()]))
+
+            # the frontier is not cached, thus the lattice is re-mined
+            self.assertFalse(session.extend_lattice(max_length=5))
+            self.assertEqual(
+                self.get_output(session, minimum_support=3, max_length=5),
+                expected)
+
+    def test_get_id_list(self):
+        sequences = self.generate_sequences(seed=9)
+
+        session = MiningSession(max_memory=None)
+        session.set(sequences=sequences)
+        session.query(minimum_support=3)
+        patterns = map(session.decode, session._lattice.get_elements())
+        self.assertTrue([x for x in patterns if x.sequence_length > 2])
+
+        for pattern in patterns:
+            id_list = session.get_id_list(pattern.sequence)
+            self.assertEqual(id_list.support, pattern.support)
+            self.assertEqual(sorted(set([x.sid for x in id_list])), sorted([
+                sid for sid in sequences if is_subsequence(
+                    pattern.sequence, tuple([
+                        sequences[sid][eid]
+                        for eid in sorted(sequences[sid])]), level=1)]))
+
+        self.assertIsNone(session.get_id_list(((6,),)))
+
+
+class SPADEmStrategyTest(unittest.TestCase):
+
+    """Tests of breadth-first search against depth-first search."""
+
+    def test_same_output(self):
+        generator = random.Random(5)
+        sequences = dict([
+            (sid, dict([(eid, tuple(generator.sample(xrange(6), 2)))
+                        for eid in xrange(generator.randint(1, 5))]))
+            for sid in xrange(30)])
+
+        outputs = {}
+        for strategy in [DFS_STRATEGY, BFS_STRATEGY, AUTO_STRATEGY]:
+            spadem = SPADEm()
+            spadem.set(sequences=sequences, minimum_support=3)
+            session = MiningSession(strategy=strategy)
+            session.set(sequences=sequences)
+            outputs[strategy] = [
+                sorted([(x.sequence, x.support) for x in elements])
+                for elements in [
+                    spadem.execute_top_support(top_k=50, strategy=strategy),
+                    spadem.execute(closed=True, strategy=strategy),
+                    spadem.execute(closed=True, max_gap=2,
+                                   strategy=strategy),
+                    session.query(minimum_support=3)]]
+
+        self.assertEqual(outputs[BFS_STRATEGY], outputs[DFS_STRATEGY])
+        self.assertEqual(outputs[AUTO_STRATEGY], outputs[DFS_STRATEGY])
+        # maximal sequences are searched depth-first only
+        for strategy in [BFS_STRATEGY, AUTO_STRATEGY]:
+            self.assertRaises(Exception, spadem.execute, strategy=strategy)
+
+        # closed and maximal sequences of the reference miner
+        frequent = mine_frequent_sequences(sequences, 3)
+        self.assertEqual(outputs[DFS_STRATEGY][1], sorted(
+            select_sequences(frequent, closed=True).items()))
+        self.assertEqual(outputs[DFS_STRATEGY][2], sorted(select_sequences(
+            mine_frequent_sequences(sequences, 3, max_gap=2),
+            closed=True).items()))
+        self.assertEqual(outputs[DFS_STRATEGY][3], sorted(
+            select_sequences(frequent).items()))
+
+
+if __name__ == '__main__':
+    unittest.main()